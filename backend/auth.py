@@ -1,19 +1,46 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 import hashlib
 import os
+import threading
+import time
 from sqlalchemy.orm import Session
 from database import get_db
 import models
 
-# to get a string like this run:
-# openssl rand -hex 32
-SECRET_KEY = "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7"
 ALGORITHM = "HS256"
+# The web client does not use refresh tokens yet, so access tokens keep their old lifetime
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = 7
+
+def load_signing_keys() -> Dict[str, str]:
+    """Read signing keys from JWT_SIGNING_KEYS ("kid:secret,kid:secret"); the first one signs new tokens.
+
+    To get a secret run: openssl rand -hex 32
+    """
+    keys: Dict[str, str] = {}
+    for entry in os.getenv("JWT_SIGNING_KEYS", "").split(","):
+        if ":" in entry:
+            kid, secret = entry.split(":", 1)
+            keys[kid.strip()] = secret.strip()
+    if not keys:
+        raise RuntimeError(
+            'JWT_SIGNING_KEYS is not set; add e.g. JWT_SIGNING_KEYS="key1:<openssl rand -hex 32>" to backend/.env'
+        )
+    return keys
+
+# Older keys stay listed after a rotation so tokens they signed remain valid until they expire
+SIGNING_KEYS = load_signing_keys()
+ACTIVE_KID = next(iter(SIGNING_KEYS))
+
+# Payloads of tokens whose signature has already been checked, until they expire
+VERIFIED_TOKEN_CACHE_SIZE = 4096
+_verified_tokens: "OrderedDict[str, dict]" = OrderedDict()
+_verified_lock = threading.Lock()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
@@ -49,24 +76,71 @@ def verify_password(plain_password: str, stored_password: str) -> bool:
     except:
         return False
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+def _encode_token(data: dict, token_type: str, expire: datetime) -> str:
     to_encode = data.copy()
+    to_encode.update({"exp": expire, "type": token_type})
+    return jwt.encode(
+        to_encode, SIGNING_KEYS[ACTIVE_KID], algorithm=ALGORITHM, headers={"kid": ACTIVE_KID}
+    )
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    return _encode_token(data, "access", expire)
+
+def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
+    """Create a long-lived token that can be exchanged for new access tokens without a password"""
+    if expires_delta:
+        expire = datetime.utcnow() + expires_delta
+    else:
+        expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    return _encode_token(data, "refresh", expire)
+
+def decode_token(token: str, token_type: str = "access") -> dict:
+    """Verify a token and return its payload, raising JWTError if it is invalid or expired"""
+    with _verified_lock:
+        payload = _verified_tokens.get(token)
+        if payload is not None:
+            if payload["exp"] > time.time():
+                _verified_tokens.move_to_end(token)
+            else:
+                del _verified_tokens[token]
+                payload = None
+
+    if payload is None:
+        kid = jwt.get_unverified_header(token).get("kid", "default")
+        key = SIGNING_KEYS.get(kid)
+        if key is None:
+            raise JWTError("Unknown signing key")
+        payload = jwt.decode(token, key, algorithms=[ALGORITHM])
+        with _verified_lock:
+            _verified_tokens[token] = payload
+            if len(_verified_tokens) > VERIFIED_TOKEN_CACHE_SIZE:
+                _verified_tokens.popitem(last=False)
+
+    # Tokens issued before refresh tokens existed carry no type and are access tokens
+    if payload.get("type", "access") != token_type:
+        raise JWTError("Wrong token type")
+    return payload
+
+def get_token_subject(token: str) -> Optional[str]:
+    """Return the username a valid token was issued to, or None"""
+    try:
+        payload = decode_token(token)
+    except JWTError:
+        return None
+    return payload.get("sub")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
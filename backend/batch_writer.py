@@ -0,0 +1,85 @@
+import asyncio
+from typing import Callable, List, Optional
+from fastapi import HTTPException, status
+
+class BatchWriter:
+    """Buffers events in memory and writes them in batches off the event loop.
+
+    A background task calls write(events) in a worker thread every interval
+    seconds, or as soon as flush_size events are waiting. Once max_buffer events
+    are waiting, add() rejects new ones with 503 rather than making callers wait.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        write: Callable[[List[dict]], None],
+        flush_size: int = 200,
+        interval: float = 5.0,
+        max_buffer: int = 5000
+    ):
+        self.name = name
+        self.write = write
+        self.flush_size = flush_size
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self.buffer: List[dict] = []
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flush_wanted: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._flusher is not None
+
+    def add(self, event: dict):
+        """Queue an event for the next batch, or raise 503 if the buffer is full"""
+        if len(self.buffer) >= self.max_buffer:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"{self.name} is busy, try again shortly",
+                headers={"Retry-After": str(int(self.interval))},
+            )
+        self.buffer.append(event)
+        if len(self.buffer) >= self.flush_size and self._flush_wanted is not None:
+            self._flush_wanted.set()
+
+    async def flush(self):
+        """Write all buffered events"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self.buffer:
+                return
+            events = self.buffer[:]
+            del self.buffer[:len(events)]
+            try:
+                await asyncio.to_thread(self.write, events)
+            except Exception as e:
+                print(f"Failed to flush {len(events)} {self.name} events: {e}")
+                # Put them back for the next attempt, as far as there is room
+                room = self.max_buffer - len(self.buffer)
+                if room > 0:
+                    self.buffer[:0] = events[-room:]
+
+    async def _flush_periodically(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_wanted.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wanted.clear()
+            await self.flush()
+
+    def start(self):
+        """Start the background flusher; call once the event loop is running"""
+        if self._flusher is None:
+            self._flush_wanted = asyncio.Event()
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self):
+        """Stop the background flusher and write whatever is still buffered"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
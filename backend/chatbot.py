@@ -1,26 +1,34 @@
 import os
+import asyncio
 import json
 import base64
-import google.generativeai as genai
 from dotenv import load_dotenv
-from PIL import Image
 from io import BytesIO
 from datetime import datetime
-from typing import List, Optional, Dict
+from typing import Iterator, List, Optional, Dict, Tuple
+import uuid
 from pydantic import BaseModel
+from schemas import Message, ChatSession, ChatHistory
+from shared_state import get_store
+import traffic_recorder
+import usage
 
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+MODEL_NAME = 'gemini-2.0-flash'
 
-# Initialize the model
-model = genai.GenerativeModel('gemini-2.0-flash')
+# Built on first use so importing this module stays cheap
+_model = None
 
-class Message(BaseModel):
-    content: str
-    role: str
+def get_model():
+    """Return the shared Gemini model, configuring the client on first call"""
+    global _model
+    if _model is None:
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY"))
+        _model = traffic_recorder.wrap_model(genai.GenerativeModel(MODEL_NAME))
+    return _model
 
 class UserProfile(BaseModel):
     verbal_score: float
@@ -127,11 +135,144 @@ USER QUERY: {user_query}
 """
 
 
+# Learner buckets: profiles are quantized by verbal/non-verbal strength, confidence and
+# age band, and each bucket gets a fixed instruction block. Prompts are then shared by
+# every learner in a bucket, so the bucket id works as a cache key for the pipeline.
+# Bump STYLE_VERSION whenever a block changes so cached answers are not reused.
+STYLE_VERSION = "v1"
+
+RESPONSE_STYLES = {
+    "verbal": """Focus on providing detailed text explanations and story-based examples.
+Break down concepts into clear, sequential steps.
+Use analogies and metaphors to explain complex ideas.
+Provide written examples and scenarios.""",
+    "non_verbal": """Focus on interactive scaffolding and visual descriptions.
+Use step-by-step guidance with clear checkpoints.
+Incorporate spatial and pattern-based explanations.
+Break complex tasks into smaller, manageable parts.""",
+    "balanced": """Provide a balanced approach with both verbal and visual explanations.
+Use concise explanations with supporting examples.
+Combine text-based and pattern-based learning strategies.""",
+}
+
+CONFIDENCE_GUIDANCE = {
+    "low": """The user has low confidence in their non-verbal skills.
+Provide additional encouragement and positive reinforcement.""",
+    "moderate": """The user has moderate confidence in their non-verbal skills.
+Maintain supportive but direct communication.""",
+    "high": """The user has high confidence in their non-verbal skills.
+Maintain supportive but direct communication.""",
+}
+
+# Matches the primary/secondary split of the assessment questions
+AGE_BANDS = {
+    "primary": "Primary school student (12 or younger)",
+    "secondary": "Secondary school student (13 to 18)",
+    "adult": "Adult learner (over 18)",
+}
+
+DEFAULT_BUCKET = f"{STYLE_VERSION}:default"
+
+def learner_bucket(user_profile: Optional[UserProfile]) -> str:
+    """Quantize a learning profile into its learner bucket id"""
+    if user_profile is None:
+        return DEFAULT_BUCKET
+
+    if user_profile.verbal_score > user_profile.non_verbal_score:
+        style = "verbal"
+    elif user_profile.non_verbal_score > user_profile.verbal_score:
+        style = "non_verbal"
+    else:
+        style = "balanced"
+
+    if user_profile.self_assessment < 5:
+        confidence = "low"
+    elif user_profile.self_assessment <= 7:
+        confidence = "moderate"
+    else:
+        confidence = "high"
+
+    if user_profile.age <= 12:
+        age_band = "primary"
+    elif user_profile.age <= 18:
+        age_band = "secondary"
+    else:
+        age_band = "adult"
+
+    return f"{STYLE_VERSION}:{style}:{confidence}:{age_band}"
+
+def _style_block(style: Optional[str], confidence: Optional[str], age_band: Optional[str]) -> str:
+    if style is None:
+        return "User Profile Information:\nNo learning profile is available yet."
+    return f"""User Profile Information:
+{AGE_BANDS[age_band]}
+
+Response Style Guidelines:
+{RESPONSE_STYLES[style]}
+{CONFIDENCE_GUIDANCE[confidence]}"""
+
+STYLE_BLOCKS: Dict[str, str] = {DEFAULT_BUCKET: _style_block(None, None, None)}
+for _style in RESPONSE_STYLES:
+    for _confidence in CONFIDENCE_GUIDANCE:
+        for _age_band in AGE_BANDS:
+            STYLE_BLOCKS[f"{STYLE_VERSION}:{_style}:{_confidence}:{_age_band}"] = _style_block(
+                _style, _confidence, _age_band
+            )
+
+LEARNER_BUCKETS = list(STYLE_BLOCKS)
+
+# Everything learner-specific comes before the query so bucket-mates share the prompt prefix
+SYNTHESIS_PROMPT = """
+You are a helpful AI assistant for helping students who have a disability called non-verbal learning to understand the concepts, ideas and solve the problems.
+
+{style_block}
+
+User Query: {user_query}
+Final Analysis: {final_analysis}
+"""
+
+
+# Used instead of the planning/analysis/synthesis chain when a user is near their budget
+SINGLE_CALL_PROMPT = """
+You are a helpful AI assistant for helping students who have a disability called non-verbal learning to understand the concepts, ideas and solve the problems.
+Identify any mistakes or gaps in the user's understanding and guide them step by step toward a correct understanding.
+
+{style_block}
+
+User Query: {user_query}
+"""
+
+
+async def generate(stage: str, prompt, **kwargs):
+    """Call the model and record its token usage against the current user and stage"""
+    response = await get_model().generate_content_async(prompt, **kwargs)
+    usage.record(stage, response)
+    return response
+
+
 async def get_chat_response(
     user_query: str,
     user_profile: Optional[UserProfile] = None,
-    image_data: bytes = None
+    image_data: bytes = None,
+    bucket: Optional[str] = None,
+    single_call: bool = False
 ) -> str:
+    _, _, response = await get_chat_analysis(user_query, user_profile, image_data, bucket, single_call)
+    return response
+
+
+async def get_chat_analysis(
+    user_query: str,
+    user_profile: Optional[UserProfile] = None,
+    image_data: bytes = None,
+    bucket: Optional[str] = None,
+    single_call: bool = False
+) -> Tuple[str, str, str]:
+    """Run the agent pipeline and return (planning analysis, final analysis, response).
+
+    bucket selects a learner bucket directly instead of deriving it from user_profile.
+    single_call skips the planning and analysis agents, leaving both analyses empty.
+    """
     try:
         # Detect coding-related query
         coding_keywords = ["python", "code", "function", "loop", "variable", "algorithm", "cpp"]
@@ -139,10 +280,10 @@ async def get_chat_response(
 
         # If it's a coding query, use the coding agent
         if is_coding_query:
-            coding_response = await model.generate_content_async(
-                CODING_AGENT_PROMPT.format(user_query=user_query)
+            coding_response = await generate(
+                "coding", CODING_AGENT_PROMPT.format(user_query=user_query)
             )
-            return coding_response.text
+            return "", "", coding_response.text
 
         # Image-based vision analysis (if provided)
         vision_analysis = ""
@@ -154,74 +295,79 @@ async def get_chat_response(
             except Exception as e:
                 print(f"Warning: Failed to process image: {str(e)}")
 
+        style_block = STYLE_BLOCKS[bucket or learner_bucket(user_profile)]
+        if single_call:
+            response = await generate(
+                "single", SINGLE_CALL_PROMPT.format(style_block=style_block, user_query=user_query)
+            )
+            return "", "", response.text
+
         # Planning + analysis agents
-        planning_analysis = await model.generate_content_async(
-            PLANNING_AGENT_PROMPT.format(user_query=user_query)
+        planning_analysis = await generate(
+            "planning", PLANNING_AGENT_PROMPT.format(user_query=user_query)
         )
-        final_analysis = await model.generate_content_async(
-            ANALYSIS_AGENT_PROMPT.format(
+        final_analysis = await generate(
+            "analysis", ANALYSIS_AGENT_PROMPT.format(
                 planning_output=planning_analysis.text,
                 user_query=user_query
             )
         )
 
-        # Personalize teaching based on user profile
-        response_style = ""
-        confidence_guidance = ""
-        if user_profile:
-            if user_profile.verbal_score > user_profile.non_verbal_score:
-                response_style = """
-                Focus on providing detailed text explanations and story-based examples.
-                Break down concepts into clear, sequential steps.
-                Use analogies and metaphors to explain complex ideas.
-                Provide written examples and scenarios.
-                """
-            elif user_profile.non_verbal_score > user_profile.verbal_score:
-                response_style = """
-                Focus on interactive scaffolding and visual descriptions.
-                Use step-by-step guidance with clear checkpoints.
-                Incorporate spatial and pattern-based explanations.
-                Break complex tasks into smaller, manageable parts.
-                """
-            else:
-                response_style = """
-                Provide a balanced approach with both verbal and visual explanations.
-                Use concise explanations with supporting examples.
-                Combine text-based and pattern-based learning strategies.
-                """
-
-            confidence_guidance = f"""
-            The user's self-assessment score is {user_profile.self_assessment}/10, indicating {'high' if user_profile.self_assessment > 7 else 'moderate' if user_profile.self_assessment > 4 else 'low'} confidence in non-verbal skills.
-            {'Provide additional encouragement and positive reinforcement.' if user_profile.self_assessment < 5 else 'Maintain supportive but direct communication.'}
-            """
-
-        # Final synthesis prompt
-        prompt = f"""
-        You are a helpful AI assistant for helping students who have a disability called non-verbal learning to understand the concepts, ideas and solve the problems.
-
-        User Profile Information:
-        {f'Age: {user_profile.age}' if user_profile else 'Age: Unknown'}
-        {f'Verbal Score: {user_profile.verbal_score}/2' if user_profile else ''}
-        {f'Non-verbal Score: {user_profile.non_verbal_score}/2' if user_profile else ''}
-        {f'Self-assessment Score: {user_profile.self_assessment}/10' if user_profile else ''}
-
-        Response Style Guidelines:
-        {response_style}
-        {confidence_guidance}
-
-        User Query: {user_query}
-        Final Analysis: {final_analysis.text}
-        """
-
-        response = await model.generate_content_async(prompt)
-        return response.text
+        # Personalize teaching with the precomputed block for the learner's bucket
+        prompt = SYNTHESIS_PROMPT.format(
+            style_block=style_block,
+            user_query=user_query,
+            final_analysis=final_analysis.text
+        )
+
+        response = await generate("synthesis", prompt)
+        return planning_analysis.text, final_analysis.text, response.text
 
     except Exception as e:
         raise Exception(f"Failed to get chat response: {str(e)}")
 
 
+FLASHCARD_PROMPT = """
+You are writing study flashcards for students with non-verbal learning disability.
+
+Write {count} flashcards about the topic "{topic}".
+* Each card tests one idea.
+* The front is a short, concrete question.
+* The back is a clear answer in one to three plain sentences, without relying on diagrams.
+
+Respond with only a JSON array of objects with "front" and "back" keys.
+"""
+
+async def generate_flashcards(topic: str, count: int = 10) -> List[Dict[str, str]]:
+    """Generate a deck of flashcards for a topic in a single model call"""
+    response = await generate(
+        "flashcards",
+        FLASHCARD_PROMPT.format(topic=topic, count=count),
+        generation_config={"response_mime_type": "application/json"}
+    )
+    text = response.text.strip()
+    # Tolerate a fenced code block around the JSON
+    if text.startswith("```"):
+        text = text.strip("`").removeprefix("json").strip()
+    try:
+        cards = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Failed to parse flashcards: {str(e)}")
+    return [
+        {"front": str(card["front"]), "back": str(card["back"])}
+        for card in cards
+        if isinstance(card, dict) and card.get("front") and card.get("back")
+    ]
+
 async def process_image(image_data: bytes) -> str:
     """Process the uploaded image data into a base64 string"""
+    # Decoding and re-encoding is CPU-bound, so keep it off the event loop
+    return await asyncio.to_thread(_encode_image, image_data)
+
+def _encode_image(image_data: bytes) -> str:
+    # PIL is only needed for image uploads, so it is imported here rather than at startup
+    from PIL import Image
+
     try:
         # Convert bytes to PIL Image
         image = Image.open(BytesIO(image_data))
@@ -257,8 +403,91 @@ async def get_vision_response(image_base64: str, query: str) -> str:
         ]
         
         # Use generate_content with both image and text
-        response = await model.generate_content_async(prompt_parts)
+        response = await generate("vision", prompt_parts)
         return response.text
     except Exception as e:
         raise Exception(f"Failed to get vision response: {str(e)}")
 
+
+# Each session is its own store entry so appending a message only touches that session
+CHAT_SESSION_NAMESPACE = "chat_sessions"
+
+# Ordered session ids per user
+CHAT_INDEX_NAMESPACE = "chat_session_index"
+
+# Per-user JSON files written by earlier versions, imported when a user has no stored sessions
+CHAT_HISTORY_DIR = "chat_histories"
+
+def _session_key(user_id: str, session_id: str) -> str:
+    return f"{user_id}/{session_id}"
+
+def _session_ids(user_id: str) -> List[str]:
+    store = get_store()
+    session_ids = store.get(CHAT_INDEX_NAMESPACE, user_id)
+    if session_ids is not None:
+        return session_ids
+
+    path = os.path.join(CHAT_HISTORY_DIR, f"{user_id}.json")
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        legacy = ChatHistory(**json.load(f))
+    store.set_many(CHAT_SESSION_NAMESPACE, {
+        _session_key(user_id, session.id): session.model_dump(mode="json")
+        for session in legacy.sessions
+    })
+    session_ids = [session.id for session in legacy.sessions]
+    store.set(CHAT_INDEX_NAMESPACE, user_id, session_ids)
+    return session_ids
+
+def iter_chat_sessions(user_id: str, offset: int = 0, limit: Optional[int] = None) -> Iterator[dict]:
+    """Yield a user's stored sessions as JSON-ready dicts, one store read at a time"""
+    store = get_store()
+    session_ids = _session_ids(user_id)[offset:]
+    if limit is not None:
+        session_ids = session_ids[:limit]
+    for session_id in session_ids:
+        data = store.get(CHAT_SESSION_NAMESPACE, _session_key(user_id, session_id))
+        if data is not None:
+            yield data
+
+def has_chat_session(user_id: str, session_id: str) -> bool:
+    return session_id in _session_ids(user_id)
+
+def create_chat_session(user_id: str, title: str = "New Chat") -> ChatSession:
+    """Create an empty chat session for a user"""
+    now = datetime.utcnow()
+    session = ChatSession(id=str(uuid.uuid4()), title=title, created_at=now, updated_at=now)
+
+    store = get_store()
+    # Make sure legacy sessions are imported before the index is first written
+    _session_ids(user_id)
+    store.set(CHAT_SESSION_NAMESPACE, _session_key(user_id, session.id), session.model_dump(mode="json"))
+    store.update(CHAT_INDEX_NAMESPACE, user_id, lambda ids: (ids or []) + [session.id])
+    return session
+
+def append_chat_messages(user_id: str, session_id: str, messages: List[Message]) -> Optional[ChatSession]:
+    """Append messages to one session and return it, or None if the user has no such session"""
+    def append(data: Optional[dict]) -> dict:
+        if data is None:
+            raise KeyError(session_id)
+        session = ChatSession(**data)
+        session.messages.extend(messages)
+        session.updated_at = datetime.utcnow()
+        return session.model_dump(mode="json")
+
+    try:
+        data = get_store().update(CHAT_SESSION_NAMESPACE, _session_key(user_id, session_id), append)
+    except KeyError:
+        return None
+    return ChatSession(**data)
+
+def delete_chat_session(user_id: str, session_id: str) -> bool:
+    """Delete a chat session; returns False if the user has no such session"""
+    if session_id not in _session_ids(user_id):
+        return False
+
+    store = get_store()
+    store.update(CHAT_INDEX_NAMESPACE, user_id, lambda ids: [i for i in (ids or []) if i != session_id])
+    store.delete(CHAT_SESSION_NAMESPACE, _session_key(user_id, session_id))
+    return True
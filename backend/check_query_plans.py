@@ -0,0 +1,58 @@
+import sys
+from typing import List, Tuple
+from sqlalchemy import text
+from database import engine
+import migrate
+
+# Queries on request paths that must be served by an index, with sample parameters
+HOT_QUERIES: List[Tuple[str, str, dict]] = [
+    ("login user lookup",
+     "SELECT * FROM users WHERE username = :username",
+     {"username": "demo_user"}),
+    ("learning profile",
+     "SELECT * FROM learning_profiles WHERE user_id = :user_id",
+     {"user_id": 1}),
+    ("recent chat messages",
+     "SELECT * FROM chat_messages WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 20",
+     {"user_id": 1}),
+    ("tutorial view history",
+     "SELECT * FROM user_tutorial_history WHERE user_id = :user_id ORDER BY viewed_at DESC LIMIT 20",
+     {"user_id": 1}),
+    ("weekly time spent",
+     "SELECT * FROM time_spent_records WHERE user_id = :user_id AND date BETWEEN :start AND :end",
+     {"user_id": 1, "start": "2025-01-01", "end": "2025-01-07"}),
+    ("flashcards due now",
+     "SELECT * FROM flashcard_schedules WHERE user_id = :user_id AND due_at <= :now ORDER BY due_at LIMIT 20",
+     {"user_id": 1, "now": "2025-01-01 00:00:00"}),
+    ("daily model token usage",
+     "SELECT SUM(total_tokens) FROM model_usage WHERE user_id = :user_id AND day = :day",
+     {"user_id": 1, "day": "2025-01-01"}),
+    ("tutorial last viewed update",
+     "UPDATE tutorials SET last_viewed_at = :viewed_at WHERE id = :tutorial_id",
+     {"viewed_at": "2025-01-01 00:00:00", "tutorial_id": 1}),
+]
+
+def problems_in_plan(plan: List[str]) -> List[str]:
+    """Full table scans and sorts that SQLite could not satisfy from an index"""
+    return [
+        detail for detail in plan
+        if (detail.startswith("SCAN ") and "USING" not in detail) or "TEMP B-TREE" in detail
+    ]
+
+def check() -> int:
+    migrate.upgrade()
+    failures = 0
+    with engine.connect() as conn:
+        for name, query, params in HOT_QUERIES:
+            plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {query}"), params)]
+            problems = problems_in_plan(plan)
+            status = "FAIL" if problems else "ok"
+            print(f"[{status}] {name}: {' | '.join(plan)}")
+            failures += bool(problems)
+    return failures
+
+if __name__ == "__main__":
+    failures = check()
+    if failures:
+        print(f"{failures} hot queries are not using an index")
+    sys.exit(1 if failures else 0)
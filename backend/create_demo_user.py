@@ -1,3 +1,6 @@
+from dotenv import load_dotenv
+load_dotenv()  # before project imports, which read their settings from the environment
+
 from sqlalchemy.orm import Session
 from database import engine, get_db
 import models
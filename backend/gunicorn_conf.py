@@ -0,0 +1,10 @@
+# Multi-process deployment: gunicorn -c gunicorn_conf.py main:app
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Set before workers fork so every worker shares caches, chat sessions and rate limits
+os.environ.setdefault("SHARED_STATE", "sqlite:shared_state.db")
@@ -0,0 +1,53 @@
+import hashlib
+import os
+from typing import Any, Callable
+from fastapi import FastAPI, Request, Response
+from starlette.middleware.gzip import GZipMiddleware
+from responses import FastJSONResponse
+
+# "gzip", "br" (needs the optional brotli-asgi package, falls back to gzip) or "off"
+COMPRESSION = os.getenv("COMPRESSION", "gzip")
+
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1000"))
+
+def add_compression(app: FastAPI):
+    """Install the response compression middleware selected by COMPRESSION"""
+    if COMPRESSION == "off":
+        return
+    if COMPRESSION == "br":
+        try:
+            from brotli_asgi import BrotliMiddleware
+            app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MIN_SIZE, gzip_fallback=True)
+            return
+        except ImportError:
+            print("brotli-asgi is not installed, falling back to gzip compression")
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
+def make_etag(*parts: Any) -> str:
+    """Build a weak ETag from the values a response is derived from.
+
+    Weak, because the compression middleware may change the bytes on the wire.
+    """
+    digest = hashlib.sha1("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'W/"{digest}"'
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+def conditional_response(request: Request, etag: str, build: Callable[[], Any]) -> Response:
+    """Return 304 if the client already has this version, otherwise build and send it.
+
+    build is only called on a miss, so unchanged resources are never serialized.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(build(), headers=headers)
@@ -0,0 +1,130 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+# Turn on event-loop diagnostics for the app
+LOOP_DIAGNOSTICS = os.getenv("LOOP_DIAGNOSTICS", "0") == "1"
+
+# A stall longer than this (seconds) is reported as a blocking call, with the loop's stack
+BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.1"))
+
+# Upper bounds (milliseconds) of the lag histogram buckets; the last bucket is unbounded
+LAG_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+class LoopMonitor:
+    """Measures event-loop lag and catches callbacks that block the loop.
+
+    A probe task sleeps for a fixed interval and records how late it wakes up.
+    A watchdog thread notices when the probe stops running and captures the
+    stack of the loop thread, which is the code that is blocking it.
+    """
+
+    def __init__(self, interval: float = 0.05, block_threshold: float = BLOCK_THRESHOLD, max_reports: int = 50):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.counts = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.lag_sum_ms = 0.0
+        self.lag_max_ms = 0.0
+        self.blocking_reports: deque = deque(maxlen=max_reports)
+        self._heartbeat = time.monotonic()
+        self._reported_heartbeat: Optional[float] = None
+        self._loop_thread_id: Optional[int] = None
+        self._probe: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start monitoring the running loop"""
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._probe = asyncio.create_task(self._run_probe())
+        self._watchdog = threading.Thread(target=self._run_watchdog, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._probe is not None:
+            self._probe.cancel()
+            try:
+                await self._probe
+            except asyncio.CancelledError:
+                pass
+            self._probe = None
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    def record_lag(self, lag_ms: float):
+        index = next((i for i, bound in enumerate(LAG_BUCKETS_MS) if lag_ms <= bound), len(LAG_BUCKETS_MS))
+        self.counts[index] += 1
+        self.lag_sum_ms += lag_ms
+        self.lag_max_ms = max(self.lag_max_ms, lag_ms)
+
+    async def _run_probe(self):
+        while True:
+            self._heartbeat = time.monotonic()
+            expected = self._heartbeat + self.interval
+            await asyncio.sleep(self.interval)
+            self.record_lag(max(0.0, time.monotonic() - expected) * 1000)
+
+    def _run_watchdog(self):
+        while not self._stop.wait(self.block_threshold / 2):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            # Report each stall once, while it is still happening so the stack points at the culprit
+            if stalled > self.block_threshold and heartbeat != self._reported_heartbeat:
+                self._reported_heartbeat = heartbeat
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame else ""
+                self.blocking_reports.append({
+                    "blocked_ms": round(stalled * 1000, 1),
+                    "detected_at": time.time(),
+                    "stack": stack,
+                })
+                print(f"Event loop blocked for over {stalled * 1000:.0f}ms:\n{stack}")
+
+    def snapshot(self) -> dict:
+        """Lag histogram and recent blocking reports, for the metrics endpoint"""
+        total = sum(self.counts)
+        buckets = [str(bound) for bound in LAG_BUCKETS_MS] + ["+Inf"]
+        return {
+            "lag_ms": {
+                "buckets": dict(zip(buckets, self.counts)),
+                "count": total,
+                "sum": round(self.lag_sum_ms, 3),
+                "mean": round(self.lag_sum_ms / total, 3) if total else 0.0,
+                "max": round(self.lag_max_ms, 3),
+            },
+            "block_threshold_ms": self.block_threshold * 1000,
+            "blocking_calls": list(self.blocking_reports),
+        }
+
+# The app-wide monitor, set by the lifespan when LOOP_DIAGNOSTICS is on
+monitor: Optional[LoopMonitor] = None
+
+@asynccontextmanager
+async def detect_blocking(threshold: float = BLOCK_THRESHOLD):
+    """Fail with AssertionError if anything inside the block stalls the loop past threshold.
+
+        async with detect_blocking():
+            await client.post("/chat", ...)
+    """
+    checker = LoopMonitor(interval=min(0.01, threshold / 4), block_threshold=threshold)
+    checker.start()
+    try:
+        yield checker
+    finally:
+        await checker.stop()
+    if checker.blocking_reports:
+        worst = max(checker.blocking_reports, key=lambda report: report["blocked_ms"])
+        raise AssertionError(
+            f"Event loop was blocked {len(checker.blocking_reports)} time(s), "
+            f"worst {worst['blocked_ms']}ms at:\n{worst['stack']}"
+        )
@@ -1,30 +1,76 @@
+import time
+_import_started = time.perf_counter()
+
+# Project modules read their settings at import time, so .env must be loaded first
+from dotenv import load_dotenv
+load_dotenv()  # load .env variables into os.environ
+
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import timedelta
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, Form, File
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, Form, File, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 import models
 import schemas
 import auth
-import chatbot
+import rate_limit
+import migrate
+import loop_monitor
+import traffic_recorder
+import usage
 from database import engine, get_db
 from typing import Optional
-from fastapi.responses import JSONResponse
-from chatbot import get_chat_response, UserProfile
-from routes import subjects, cache
+import chatbot
+from routes import subjects, cache, tutorials, flashcards
+from routes import chat as chat_routes
+from responses import FastJSONResponse
+from http_cache import add_compression, make_etag, conditional_response
 
-from dotenv import load_dotenv
 import os
 
-load_dotenv()  # load .env variables into os.environ
+_import_seconds = time.perf_counter() - _import_started
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Time each startup step so slow boots are easy to attribute
+    timings = {"imports": _import_seconds}
+
+    started = time.perf_counter()
+    # Bring the database schema up to date
+    await asyncio.to_thread(migrate.upgrade, engine)
+    timings["migrations"] = time.perf_counter() - started
 
-import google.generativeai as genai
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    started = time.perf_counter()
+    await asyncio.to_thread(cache.load_cache)
+    timings["load_cache"] = time.perf_counter() - started
 
-# Create the database tables
-models.Base.metadata.create_all(bind=engine)
+    tutorials.view_events.start()
+    flashcards.review_events.start()
+    usage.usage_events.start()
 
-app = FastAPI()
+    if loop_monitor.LOOP_DIAGNOSTICS:
+        loop_monitor.monitor = loop_monitor.LoopMonitor()
+        loop_monitor.monitor.start()
+
+    summary = ", ".join(f"{step}={seconds * 1000:.1f}ms" for step, seconds in timings.items())
+    print(f"Startup profile: {summary} (total {sum(timings.values()) * 1000:.1f}ms)")
+
+    yield
+
+    if loop_monitor.monitor is not None:
+        await loop_monitor.monitor.stop()
+    await tutorials.view_events.stop()
+    await flashcards.review_events.stop()
+    await usage.usage_events.stop()
+
+app = FastAPI(lifespan=lifespan)
+
+add_compression(app)
+
+# Added before CORS so that 429 responses still carry CORS headers
+app.add_middleware(rate_limit.RateLimitMiddleware)
 
 # Configure CORS
 app.add_middleware(
@@ -39,6 +85,9 @@ app.add_middleware(
 # Include routers
 app.include_router(subjects.router, prefix="/api/subjects", tags=["subjects"])
 app.include_router(cache.router, prefix="/api/cache", tags=["cache"])
+app.include_router(tutorials.router, prefix="/api/tutorials", tags=["tutorials"])
+app.include_router(flashcards.router, prefix="/api/flashcards", tags=["flashcards"])
+app.include_router(chat_routes.router, prefix="/chat", tags=["chat"])
 
 @app.post("/signup", response_model=schemas.User)
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
@@ -88,7 +137,34 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     access_token = auth.create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    refresh_token = auth.create_refresh_token(data={"sub": user.username})
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@app.post("/token/refresh", response_model=schemas.Token)
+def refresh_access_token(body: schemas.TokenRefresh, db: Session = Depends(get_db)):
+    """Exchange a refresh token for a new access token without re-checking the password"""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        username = auth.decode_token(body.refresh_token, token_type="refresh").get("sub")
+    except auth.JWTError:
+        raise credentials_exception
+    if username is None:
+        raise credentials_exception
+
+    # Make sure the account still exists before handing out a new token
+    user = db.query(models.User).filter(models.User.username == username).first()
+    if not user:
+        raise credentials_exception
+
+    access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = auth.create_access_token(
+        data={"sub": user.username}, expires_delta=access_token_expires
+    )
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": body.refresh_token}
 
 @app.post("/assessment/profile", response_model=schemas.LearningProfile)
 def create_learning_profile(
@@ -115,6 +191,7 @@ def create_learning_profile(
 
 @app.get("/assessment/profile", response_model=schemas.LearningProfile)
 def get_learning_profile(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
@@ -124,7 +201,10 @@ def get_learning_profile(
     
     if not profile:
         raise HTTPException(status_code=404, detail="Learning profile not found")
-    return profile
+    etag = make_etag(
+        profile.id, profile.verbal_score, profile.non_verbal_score, profile.self_assessment, profile.age
+    )
+    return conditional_response(request, etag, lambda: schemas.trusted(schemas.LearningProfile, profile))
 
 @app.put("/assessment/profile", response_model=schemas.LearningProfile)
 def update_learning_profile(
@@ -162,28 +242,6 @@ def delete_learning_profile(
     db.commit()
     return {"message": "Learning profile deleted successfully"}
 
-@app.post("/api/chat/sessions")
-async def create_session(
-    title: str = "New Chat",
-    user_id: str = Form("default_user")
-):
-    """Create a new chat session"""
-    try:
-        session = chatbot.create_chat_session(user_id, title)
-        return session
-    except Exception as e:
-        print(f"Error creating session: {e}")
-        return JSONResponse(
-            status_code=500,
-            content={"error": "Failed to create session"}
-        )
-
-@app.get("/chat/history")
-async def get_history(current_user: models.User = Depends(auth.get_current_user)):
-    """Get all chat history for the current user"""
-    history = chatbot.get_chat_history(str(current_user.id))
-    return history
-
 @app.post("/chat")
 async def chat(
     message: str = Form(...),
@@ -191,50 +249,48 @@ async def chat(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
+    started = time.time()
+    user_profile = None
+    image_data = None
+    response_status = status.HTTP_200_OK
     try:
         # Get user's learning profile
-        profile = db.query(models.LearningProfile).filter(
-            models.LearningProfile.user_id == current_user.id
-        ).first()
-
-        # Convert profile to UserProfile if it exists
-        user_profile = None
-        if profile:
-            user_profile = UserProfile(
-                verbal_score=profile.verbal_score,
-                non_verbal_score=profile.non_verbal_score,
-                self_assessment=profile.self_assessment,
-                age=profile.age
-            )
+        user_profile = await asyncio.to_thread(chat_routes.get_user_profile, db, current_user.id)
 
         # Process image if provided
-        image_data = None
         if image:
             image_data = await image.read()
 
         # Get response from chatbot
-        response = await get_chat_response(
-            user_query=message,
-            user_profile=user_profile,
-            image_data=image_data
-        )
+        _, _, response = await chat_routes.run_chat(current_user.id, message, user_profile, image_data)
 
-        return {"response": response if response else "I'm sorry, I couldn't generate a response."}
+        return FastJSONResponse({
+            "response": response if response else "I'm sorry, I couldn't generate a response.",
+            # Lets clients scope cached explanations to the learner's bucket
+            "learner_bucket": chatbot.learner_bucket(user_profile),
+        })
+    except HTTPException as e:
+        response_status = e.status_code
+        raise
     except Exception as e:
+        response_status = status.HTTP_500_INTERNAL_SERVER_ERROR
         print(f"Chat error: {e}")  # Log the error
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+    finally:
+        await traffic_recorder.record_chat(
+            message, cache.explanation_subcategory(message), chatbot.learner_bucket(user_profile), image_data,
+            started, time.time() - started, response_status
+        )
 
-@app.delete("/chat/sessions/{session_id}")
-async def delete_session(
-    session_id: str,
-    current_user: models.User = Depends(auth.get_current_user)
-):
-    """Delete a chat session"""
-    success = chatbot.delete_chat_session(str(current_user.id), session_id)
-    return {"status": "success" if success else "failed"}
+@app.get("/metrics/event-loop")
+async def get_event_loop_metrics():
+    """Event-loop lag histogram and recent blocking calls (needs LOOP_DIAGNOSTICS=1)"""
+    if loop_monitor.monitor is None:
+        raise HTTPException(status_code=404, detail="Event-loop diagnostics are disabled")
+    return FastJSONResponse(loop_monitor.monitor.snapshot())
 
 @app.get("/signup/me", response_model=schemas.User)
 def get_current_user_info(current_user: models.User = Depends(auth.get_current_user)):
@@ -242,4 +298,10 @@ def get_current_user_info(current_user: models.User = Depends(auth.get_current_u
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        # Workers are separate processes, so caches, sessions and limits must live in a shared store
+        os.environ.setdefault("SHARED_STATE", "sqlite:shared_state.db")
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
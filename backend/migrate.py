@@ -0,0 +1,57 @@
+import importlib
+import os
+from datetime import datetime
+from typing import List
+from sqlalchemy import text
+from database import engine
+
+# Versioned scripts named NNNN_description.py, each defining upgrade(conn)
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+def available_migrations() -> List[str]:
+    return sorted(
+        name[:-3] for name in os.listdir(MIGRATIONS_DIR)
+        if name.endswith(".py") and name[:4].isdigit()
+    )
+
+def applied_migrations(conn) -> List[str]:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations "
+        "(version VARCHAR NOT NULL PRIMARY KEY, applied_at DATETIME NOT NULL)"
+    ))
+    return [row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))]
+
+def _begin_locked(conn):
+    """Take the database write lock before reading, so concurrent runners queue up behind it"""
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+def upgrade(bind=engine) -> List[str]:
+    """Apply every migration that has not run yet, each in its own transaction.
+
+    Safe to call from every worker at startup: each migration is applied under the
+    write lock after re-checking schema_migrations, so only one runner applies it.
+    """
+    applied = []
+    for version in available_migrations():
+        with bind.connect() as conn:
+            _begin_locked(conn)
+            if version in applied_migrations(conn):
+                conn.rollback()
+                continue
+            module = importlib.import_module(f"migrations.{version}")
+            module.upgrade(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, applied_at) VALUES (:version, :applied_at)"),
+                {"version": version, "applied_at": datetime.utcnow()}
+            )
+            conn.commit()
+        applied.append(version)
+    return applied
+
+if __name__ == "__main__":
+    applied = upgrade()
+    if applied:
+        print(f"Applied migrations: {', '.join(applied)}")
+    else:
+        print("Database is up to date")
@@ -0,0 +1,80 @@
+"""Tables as Base.metadata.create_all created them before migrations existed"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS users (
+        id INTEGER NOT NULL PRIMARY KEY,
+        username VARCHAR,
+        email VARCHAR,
+        hashed_password VARCHAR
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_username ON users (username)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email)",
+
+    """CREATE TABLE IF NOT EXISTS learning_profiles (
+        id INTEGER NOT NULL PRIMARY KEY,
+        user_id INTEGER UNIQUE REFERENCES users (id),
+        verbal_score FLOAT,
+        non_verbal_score FLOAT,
+        self_assessment INTEGER,
+        age INTEGER
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_learning_profiles_id ON learning_profiles (id)",
+
+    """CREATE TABLE IF NOT EXISTS chat_messages (
+        id INTEGER NOT NULL PRIMARY KEY,
+        user_id INTEGER REFERENCES users (id),
+        content TEXT,
+        response TEXT,
+        planning_analysis TEXT,
+        final_analysis TEXT,
+        created_at DATETIME
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_chat_messages_id ON chat_messages (id)",
+
+    """CREATE TABLE IF NOT EXISTS subjects (
+        id INTEGER NOT NULL PRIMARY KEY,
+        name VARCHAR,
+        category VARCHAR,
+        subcategory VARCHAR,
+        description TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_subjects_id ON subjects (id)",
+    "CREATE INDEX IF NOT EXISTS ix_subjects_name ON subjects (name)",
+    "CREATE INDEX IF NOT EXISTS ix_subjects_category ON subjects (category)",
+
+    """CREATE TABLE IF NOT EXISTS tutorials (
+        id INTEGER NOT NULL PRIMARY KEY,
+        subject_id INTEGER REFERENCES subjects (id),
+        title VARCHAR,
+        content TEXT,
+        difficulty_level VARCHAR,
+        visual_aids TEXT,
+        created_at DATETIME,
+        last_viewed_at DATETIME
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_tutorials_id ON tutorials (id)",
+    "CREATE INDEX IF NOT EXISTS ix_tutorials_title ON tutorials (title)",
+
+    """CREATE TABLE IF NOT EXISTS user_tutorial_history (
+        id INTEGER NOT NULL PRIMARY KEY,
+        user_id INTEGER REFERENCES users (id),
+        tutorial_id INTEGER REFERENCES tutorials (id),
+        viewed_at DATETIME
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_user_tutorial_history_id ON user_tutorial_history (id)",
+
+    """CREATE TABLE IF NOT EXISTS time_spent_records (
+        id INTEGER NOT NULL PRIMARY KEY,
+        user_id INTEGER REFERENCES users (id),
+        date DATE,
+        total_seconds INTEGER
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_time_spent_records_id ON time_spent_records (id)",
+]
+
+def upgrade(conn):
+    # IF NOT EXISTS lets databases created by create_all adopt this migration unchanged
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
@@ -0,0 +1,15 @@
+"""Composite indexes for per-user history and analytics reads"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS ix_chat_messages_user_id_created_at "
+    "ON chat_messages (user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_user_tutorial_history_user_id_viewed_at "
+    "ON user_tutorial_history (user_id, viewed_at)",
+    "CREATE INDEX IF NOT EXISTS ix_time_spent_records_user_id_date "
+    "ON time_spent_records (user_id, date)",
+]
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
@@ -0,0 +1,34 @@
+"""Flashcard decks and per-user SM-2 review schedules"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS flashcards (
+        id INTEGER NOT NULL PRIMARY KEY,
+        topic VARCHAR,
+        front TEXT,
+        back TEXT,
+        created_at DATETIME
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_flashcards_id ON flashcards (id)",
+    "CREATE INDEX IF NOT EXISTS ix_flashcards_topic ON flashcards (topic)",
+
+    """CREATE TABLE IF NOT EXISTS flashcard_schedules (
+        id INTEGER NOT NULL PRIMARY KEY,
+        user_id INTEGER REFERENCES users (id),
+        flashcard_id INTEGER REFERENCES flashcards (id),
+        ease_factor FLOAT,
+        interval_days INTEGER,
+        repetitions INTEGER,
+        due_at DATETIME,
+        last_reviewed_at DATETIME
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_flashcard_schedules_id ON flashcard_schedules (id)",
+    "CREATE INDEX IF NOT EXISTS ix_flashcard_schedules_user_id_due_at "
+    "ON flashcard_schedules (user_id, due_at)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_flashcard_schedules_user_id_flashcard_id "
+    "ON flashcard_schedules (user_id, flashcard_id)",
+]
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
@@ -0,0 +1,22 @@
+"""Per-user, per-stage, per-day model token ledger"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS model_usage (
+        id INTEGER NOT NULL PRIMARY KEY,
+        user_id INTEGER REFERENCES users (id),
+        stage VARCHAR,
+        day DATE,
+        calls INTEGER,
+        prompt_tokens INTEGER,
+        output_tokens INTEGER,
+        total_tokens INTEGER
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_model_usage_id ON model_usage (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_model_usage_user_id_day_stage "
+    "ON model_usage (user_id, day, stage)",
+]
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
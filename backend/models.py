@@ -1,9 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Text, DateTime, Boolean, Date
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Text, DateTime, Boolean, Date, Index
 from sqlalchemy.orm import relationship
-from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
-
-Base = declarative_base()
+from database import Base
 
 class User(Base):
     __tablename__ = "users"
@@ -44,6 +42,9 @@ class ChatMessage(Base):
     # Relationship with User
     user = relationship("User", back_populates="chat_messages")
 
+    # Per-user history is read newest first
+    __table_args__ = (Index("ix_chat_messages_user_id_created_at", "user_id", "created_at"),)
+
 class Subject(Base):
     __tablename__ = "subjects"
     
@@ -84,6 +85,8 @@ class UserTutorialHistory(Base):
     user = relationship("User", backref="tutorial_history")
     tutorial = relationship("Tutorial", back_populates="user_history")
 
+    __table_args__ = (Index("ix_user_tutorial_history_user_id_viewed_at", "user_id", "viewed_at"),)
+
 class TimeSpentRecord(Base):
     __tablename__ = "time_spent_records"
     
@@ -93,4 +96,51 @@ class TimeSpentRecord(Base):
     total_seconds = Column(Integer, default=0)
     
     # Relationship with User
-    user = relationship("User", backref="time_spent_records") 
\ No newline at end of file
+    user = relationship("User", backref="time_spent_records")
+
+    __table_args__ = (Index("ix_time_spent_records_user_id_date", "user_id", "date"),)
+
+class Flashcard(Base):
+    __tablename__ = "flashcards"
+
+    id = Column(Integer, primary_key=True, index=True)
+    topic = Column(String, index=True)  # Subcategory from subjects.json
+    front = Column(Text)
+    back = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class FlashcardSchedule(Base):
+    __tablename__ = "flashcard_schedules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    flashcard_id = Column(Integer, ForeignKey("flashcards.id"))
+    # SM-2 state
+    ease_factor = Column(Float, default=2.5)
+    interval_days = Column(Integer, default=0)
+    repetitions = Column(Integer, default=0)
+    due_at = Column(DateTime, default=datetime.utcnow)
+    last_reviewed_at = Column(DateTime, nullable=True)
+
+    flashcard = relationship("Flashcard")
+
+    # "Cards due now" is a single range scan on this index
+    __table_args__ = (
+        Index("ix_flashcard_schedules_user_id_due_at", "user_id", "due_at"),
+        Index("ix_flashcard_schedules_user_id_flashcard_id", "user_id", "flashcard_id", unique=True),
+    )
+
+class ModelUsage(Base):
+    __tablename__ = "model_usage"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # None for system work
+    stage = Column(String)  # Pipeline step, e.g. "planning" or "synthesis"
+    day = Column(Date)
+    calls = Column(Integer, default=0)
+    prompt_tokens = Column(Integer, default=0)
+    output_tokens = Column(Integer, default=0)
+    total_tokens = Column(Integer, default=0)
+
+    # Budget checks sum one user's rows for one day
+    __table_args__ = (Index("ix_model_usage_user_id_day_stage", "user_id", "day", "stage", unique=True),)
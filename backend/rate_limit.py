@@ -0,0 +1,148 @@
+import asyncio
+import math
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Pattern, Tuple
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+import auth
+import shared_state
+
+# Bucket size and refill rate (tokens per second) shared by every client
+BUCKET_CAPACITY = float(os.getenv("RATE_LIMIT_CAPACITY", "60"))
+REFILL_RATE = float(os.getenv("RATE_LIMIT_REFILL_RATE", "1"))
+
+# Tokens charged per request, roughly proportional to what the route costs us.
+# Chat turns make up to four model calls, a deck's first visit generates it through
+# the model, /login and /signup run a 100k-iteration PBKDF2. Keys are route templates.
+ROUTE_COSTS: Dict[Tuple[str, str], float] = {
+    ("POST", "/chat"): 8,
+    ("POST", "/chat/{session_id}/messages"): 8,
+    ("GET", "/api/flashcards/decks/{topic}"): 8,
+    ("POST", "/login"): 10,
+    ("POST", "/signup"): 10,
+}
+DEFAULT_COST = 1
+
+def _template_pattern(template: str) -> Pattern:
+    parts = re.split(r"\{[^/}]+\}", template)
+    return re.compile("^" + "[^/]+".join(re.escape(part) for part in parts) + "$")
+
+# Middleware runs before routing, so request paths are matched against the templates here
+_COST_PATTERNS: List[Tuple[str, Pattern, float]] = [
+    (method, _template_pattern(template), cost) for (method, template), cost in ROUTE_COSTS.items()
+]
+
+def route_cost(method: str, path: str) -> float:
+    for route_method, pattern, cost in _COST_PATTERNS:
+        if route_method == method and pattern.match(path):
+            return cost
+    return DEFAULT_COST
+
+# Seconds between sweeps of in-memory buckets that have refilled
+SWEEP_INTERVAL = 60
+
+class MemoryBucketStore:
+    """Token buckets kept in this process"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def _sweep(self, now: float, capacity: float, rate: float):
+        """Forget buckets that are full again; a missing bucket starts out full anyway"""
+        self._buckets = {
+            key: (tokens, updated) for key, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * rate < capacity
+        }
+        self._last_sweep = now
+
+    def take(self, key: str, cost: float, capacity: float, rate: float) -> float:
+        """Charge cost tokens to key; returns 0 if allowed, else seconds until it would be"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_sweep >= SWEEP_INTERVAL:
+                self._sweep(now, capacity, rate)
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens < cost:
+                self._buckets[key] = (tokens, now)
+                return (cost - tokens) / rate
+            self._buckets[key] = (tokens - cost, now)
+            return 0
+
+class SQLiteBucketStore(shared_state.SQLiteConnections):
+    """Token buckets kept in a SQLite file, shared by every process on the host"""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets "
+            "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def take(self, key: str, cost: float, capacity: float, rate: float) -> float:
+        """Charge cost tokens to key; returns 0 if allowed, else seconds until it would be"""
+        with self._write() as conn:
+            # Wall clock, since monotonic time is not comparable across processes
+            now = time.time()
+            row = conn.execute(
+                "SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + max(0, now - updated) * rate)
+            wait = 0
+            if tokens < cost:
+                wait = (cost - tokens) / rate
+            else:
+                tokens -= cost
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens, now)
+            )
+            return wait
+
+def create_store():
+    """Pick the bucket store from RATE_LIMIT_STORE ("memory" or "sqlite:<path>"), defaulting to SHARED_STATE"""
+    setting = os.getenv("RATE_LIMIT_STORE", shared_state.SHARED_STATE)
+    if setting.startswith("sqlite:"):
+        return SQLiteBucketStore(setting[len("sqlite:"):])
+    return MemoryBucketStore()
+
+def client_key(request: Request) -> str:
+    """Identify the caller by the user in their bearer token, falling back to their IP"""
+    authorization = request.headers.get("Authorization", "")
+    if authorization.lower().startswith("bearer "):
+        username = auth.get_token_subject(authorization[7:])
+        if username:
+            return f"user:{username}"
+    host = request.client.host if request.client else "unknown"
+    return f"ip:{host}"
+
+class RateLimitMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, store=None):
+        super().__init__(app)
+        self.store = store or create_store()
+
+    async def dispatch(self, request: Request, call_next):
+        if request.method == "OPTIONS":
+            return await call_next(request)
+
+        cost = route_cost(request.method, request.url.path)
+        key = client_key(request)
+        if isinstance(self.store, SQLiteBucketStore):
+            # May wait on another process's write lock, so keep it off the event loop
+            wait = await asyncio.to_thread(self.store.take, key, cost, BUCKET_CAPACITY, REFILL_RATE)
+        else:
+            wait = self.store.take(key, cost, BUCKET_CAPACITY, REFILL_RATE)
+        if wait > 0:
+            return JSONResponse(
+                status_code=429,
+                content={"detail": "Too many requests"},
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+        return await call_next(request)
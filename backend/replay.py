@@ -0,0 +1,147 @@
+from dotenv import load_dotenv
+load_dotenv()  # before project imports, which read their settings from the environment
+
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from io import BytesIO
+from typing import Dict, List, Optional
+
+import chatbot
+import traffic_recorder
+from routes import cache
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+class ReplayModel:
+    """Stands in for the Gemini model: serves recorded responses, or a stub reply.
+
+    Latencies are the recorded ones (or stub_latency_ms) divided by speedup.
+    Requests with an image always miss: only a hash of the upload is recorded and
+    a placeholder image is sent instead, which changes every prompt downstream.
+    Responses are only recorded with CHAT_RECORDING_QUERIES; otherwise queries are
+    replayed as filler of the recorded length and every call gets the stub.
+    """
+
+    def __init__(self, responses: Dict[str, dict], stub_latency_ms: float, speedup: float):
+        self.responses = responses
+        self.stub_latency_ms = stub_latency_ms
+        self.speedup = speedup
+        self.hits = 0
+        self.misses = 0
+
+    async def generate_content_async(self, prompt, **kwargs):
+        recorded = self.responses.get(traffic_recorder.prompt_hash(prompt))
+        if recorded:
+            self.hits += 1
+            text, latency_ms = recorded["text"], recorded["latency_ms"]
+        else:
+            self.misses += 1
+            text, latency_ms = "Stub response.", self.stub_latency_ms
+        if self.speedup > 0:
+            await asyncio.sleep(latency_ms / 1000 / self.speedup)
+        return _Response(text)
+
+def load_jsonl(path: str) -> List[dict]:
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def placeholder_image() -> bytes:
+    """A small valid image standing in for a recorded upload, which is only kept as a hash"""
+    from PIL import Image
+
+    buffered = BytesIO()
+    Image.new("RGB", (64, 64), "white").save(buffered, format="PNG")
+    return buffered.getvalue()
+
+def replay_query(record: dict) -> str:
+    """The recorded query text, else the explanation question, else filler with the recorded word count"""
+    if record.get("query"):
+        return record["query"]
+    if record.get("subcategory"):
+        return cache.EXPLANATION_QUERY.format(subcategory=record["subcategory"])
+    return " ".join(["lorem"] * max(1, record.get("query_words", 1)))
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def replay(records: List[dict], model: ReplayModel, speedup: float) -> dict:
+    chatbot._model = model
+    latencies: List[float] = []
+    errors = 0
+    explanation_queries = 0
+    explanation_hits = 0
+    image = placeholder_image() if any(r.get("image_size") for r in records) else None
+
+    async def send(record: dict):
+        nonlocal errors
+        if speedup > 0:
+            await asyncio.sleep(record["offset"] / speedup)
+        started = time.perf_counter()
+        try:
+            await chatbot.get_chat_response(
+                user_query=replay_query(record),
+                image_data=image if record.get("image_size") else None,
+                # Buckets from an older STYLE_VERSION no longer exist
+                bucket=record["bucket"] if record["bucket"] in chatbot.STYLE_BLOCKS else chatbot.DEFAULT_BUCKET
+            )
+        except Exception:
+            errors += 1
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    # Would the explanation cache have answered this request without the pipeline?
+    for record in records:
+        subcategory = cache.explanation_subcategory(replay_query(record))
+        if subcategory:
+            explanation_queries += 1
+            explanation_hits += cache.lookup_explanation(subcategory, record["bucket"]) is not None
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(record) for record in records))
+    elapsed = time.perf_counter() - started
+
+    model_calls = model.hits + model.misses
+    return {
+        "requests": len(records),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(records) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.5), 1),
+            "p90": round(percentile(latencies, 0.9), 1),
+            "p99": round(percentile(latencies, 0.99), 1),
+            "max": round(max(latencies, default=0.0), 1),
+        },
+        "model_calls": model_calls,
+        "recorded_response_hit_rate": round(model.hits / model_calls, 3) if model_calls else 0.0,
+        "explanation_cache_hit_rate": round(explanation_hits / explanation_queries, 3) if explanation_queries else None,
+        "learner_buckets": dict(Counter(record["bucket"] for record in records)),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded /chat traffic against the agent pipeline")
+    parser.add_argument("recording", help="JSONL file written with CHAT_RECORDING")
+    parser.add_argument("--responses", help="Recorded model responses (defaults to <recording>.responses if present)")
+    parser.add_argument("--speedup", type=float, default=1.0,
+                        help="Replay this many times faster than recorded; 0 sends everything at once with no model latency")
+    parser.add_argument("--stub-latency-ms", type=float, default=800.0,
+                        help="Latency of model calls that have no recorded response")
+    args = parser.parse_args()
+
+    records = load_jsonl(args.recording)
+    responses_path: Optional[str] = args.responses or args.recording + traffic_recorder.RESPONSES_SUFFIX
+    try:
+        responses = {r["prompt_sha256"]: r for r in load_jsonl(responses_path)}
+    except FileNotFoundError:
+        responses = {}
+
+    cache.load_cache()
+    model = ReplayModel(responses, args.stub_latency_ms, args.speedup)
+    print(json.dumps(asyncio.run(replay(records, model, args.speedup)), indent=2))
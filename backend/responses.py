@@ -0,0 +1,41 @@
+import json
+from typing import Any, Iterable, Iterator
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+# orjson is optional; without it responses fall back to the stdlib encoder
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps(content: Any) -> bytes:
+    """Serialize a pydantic model or plain JSON data to bytes"""
+    if isinstance(content, BaseModel):
+        return content.model_dump_json().encode("utf-8")
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSON response that serializes without FastAPI's jsonable_encoder pass.
+
+    Return it directly from a handler with data that is already trusted (ORM rows
+    wrapped with schemas.trusted, or plain dicts); it is not validated again.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def stream_json_object(fields: dict, list_field: str, rows: Iterable[Any]) -> StreamingResponse:
+    """Stream {**fields, list_field: [rows...]} one row at a time instead of building it in memory"""
+    def generate() -> Iterator[bytes]:
+        head = dumps(fields)
+        yield head[:-1] + (b"," if fields else b"") + dumps(list_field) + b":["
+        first = True
+        for row in rows:
+            yield (b"" if first else b",") + dumps(row)
+            first = False
+        yield b"]}"
+
+    return StreamingResponse(generate(), media_type="application/json")
@@ -1,45 +1,102 @@
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Request
+import asyncio
 import json
+import re
+import tempfile
+import threading
 from typing import Dict, Optional
 import os
 from pydantic import BaseModel
+import chatbot
+from shared_state import get_store
+from http_cache import make_etag, conditional_response
 
 router = APIRouter()
 
-# In-memory cache
-_cache: Dict[str, str] = {}
+# Explanations live in the shared store so every worker sees the same cache
+NAMESPACE = "explanations"
 
 # Cache file path
 CACHE_FILE = "subject_cache.json"
+_save_lock = threading.Lock()
+
+# Bump when the explanation prompt or pipeline changes so warmed entries are regenerated
+EXPLANATION_VERSION = "v1"
+
+# Question the resources page sends to /chat on a cache miss
+EXPLANATION_QUERY = "I don't understand {subcategory}. Can you explain it to me?"
+
+_EXPLANATION_PATTERN = re.compile(
+    "^" + re.escape(EXPLANATION_QUERY).replace(re.escape("{subcategory}"), "(?P<subcategory>.+)") + "$"
+)
 
 class ExplanationBody(BaseModel):
     explanation: str
 
+def cache_key(subcategory: str, bucket: Optional[str] = None, version: str = EXPLANATION_VERSION) -> str:
+    """Build the cache key for a subcategory, optionally scoped to a profile bucket"""
+    if bucket is None:
+        return subcategory
+    return f"{subcategory}::{bucket}::{version}"
+
 def load_cache():
     """Load cache from file if it exists"""
+    # A shared store that already holds entries is newer than the file snapshot
+    if get_store().items(NAMESPACE):
+        return
     if os.path.exists(CACHE_FILE):
         with open(CACHE_FILE, 'r') as f:
-            global _cache
-            _cache = json.load(f)
+            get_store().set_many(NAMESPACE, json.load(f))
 
 def save_cache():
     """Save cache to file"""
-    with open(CACHE_FILE, 'w') as f:
-        json.dump(_cache, f)
+    # Saves run in worker threads; one at a time per process so the newest snapshot lands last
+    with _save_lock:
+        # Write to a uniquely named temporary file first so concurrent writers never leave a torn file
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(CACHE_FILE)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(get_store().items(NAMESPACE), f)
+            os.replace(tmp_file, CACHE_FILE)
+        except BaseException:
+            os.unlink(tmp_file)
+            raise
 
-# Load cache on startup
-load_cache()
+def has_explanation(key: str) -> bool:
+    return get_store().contains(NAMESPACE, key)
 
-@router.get("/explanation/{subcategory}")
-async def get_cached_explanation(subcategory: str) -> Dict[str, Optional[str]]:
+def bulk_load(entries: Dict[str, str]):
+    """Merge many explanations into the cache and persist them with a single write"""
+    get_store().set_many(NAMESPACE, entries)
+    save_cache()
+
+def explanation_subcategory(query: str) -> Optional[str]:
+    """The subcategory a chat query asks to have explained, if it is the resources page question"""
+    match = _EXPLANATION_PATTERN.match(query)
+    return match.group("subcategory") if match else None
+
+def lookup_explanation(subcategory: str, bucket: Optional[str] = None) -> Optional[str]:
+    store = get_store()
+    if bucket is not None:
+        explanation = store.get(NAMESPACE, cache_key(subcategory, bucket))
+        if explanation is not None:
+            return explanation
+    return store.get(NAMESPACE, subcategory)
+
+@router.get("/explanation/{subcategory}", response_model=Dict[str, Optional[str]])
+async def get_cached_explanation(subcategory: str, request: Request, bucket: Optional[str] = None):
     """Get cached explanation for a subcategory"""
-    if subcategory in _cache:
-        return {"explanation": _cache[subcategory]}
-    return {"explanation": None}
+    explanation = await asyncio.to_thread(lookup_explanation, subcategory, bucket)
+    return conditional_response(
+        request, make_etag(subcategory, bucket, explanation), lambda: {"explanation": explanation}
+    )
 
 @router.post("/explanation/{subcategory}")
-async def cache_explanation(subcategory: str, body: ExplanationBody):
-    """Cache explanation for a subcategory"""
-    _cache[subcategory] = body.explanation
-    save_cache()
-    return {"status": "success"} 
\ No newline at end of file
+async def cache_explanation(subcategory: str, body: ExplanationBody, bucket: Optional[str] = None):
+    """Cache explanation for a subcategory, optionally for one learner bucket"""
+    # Only real buckets, so callers cannot fill the cache with junk keys or pre-empt warm_cache
+    if bucket is not None and bucket not in chatbot.STYLE_BLOCKS:
+        raise HTTPException(status_code=422, detail=f"Unknown learner bucket: {bucket}")
+    await asyncio.to_thread(get_store().set, NAMESPACE, cache_key(subcategory, bucket), body.explanation)
+    await asyncio.to_thread(save_cache)
+    return {"status": "success"}
@@ -0,0 +1,140 @@
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, Form, File, Query, status
+import asyncio
+from typing import Optional, Tuple
+from sqlalchemy.orm import Session
+import models
+import schemas
+import auth
+import chatbot
+import usage
+from chatbot import UserProfile
+from schemas import Message
+from routes import cache
+from database import get_db
+from responses import FastJSONResponse, stream_json_object
+
+router = APIRouter()
+
+def get_user_profile(db: Session, user_id: int) -> Optional[UserProfile]:
+    """Load the user's learning profile in the shape the chatbot expects"""
+    profile = db.query(models.LearningProfile).filter(
+        models.LearningProfile.user_id == user_id
+    ).first()
+    if not profile:
+        return None
+    return UserProfile(
+        verbal_score=profile.verbal_score,
+        non_verbal_score=profile.non_verbal_score,
+        self_assessment=profile.self_assessment,
+        age=profile.age
+    )
+
+async def run_chat(
+    user_id: int,
+    query: str,
+    user_profile: Optional[UserProfile],
+    image_data: Optional[bytes]
+) -> Tuple[str, str, str]:
+    """Answer a chat turn within the user's daily model budget.
+
+    Near the budget the cheaper single-call pipeline is used; past it only
+    cached explanations are served, and anything else gets a 429.
+    """
+    mode = await usage.budget_mode(user_id)
+    if mode == usage.EXHAUSTED:
+        subcategory = cache.explanation_subcategory(query)
+        cached = await asyncio.to_thread(
+            cache.lookup_explanation, subcategory, chatbot.learner_bucket(user_profile)
+        ) if subcategory else None
+        if cached is None:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Daily tutoring limit reached, please come back tomorrow",
+                headers={"Retry-After": str(usage.seconds_until_reset())},
+            )
+        return "", "", cached
+
+    token = usage.current_user.set(user_id)
+    try:
+        return await chatbot.get_chat_analysis(
+            user_query=query,
+            user_profile=user_profile,
+            image_data=image_data,
+            single_call=mode == usage.REDUCED
+        )
+    finally:
+        usage.current_user.reset(token)
+
+@router.post("/sessions", response_model=schemas.ChatSession)
+async def create_session(
+    body: Optional[schemas.ChatSessionCreate] = None,
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Create a new chat session"""
+    title = body.title if body and body.title else "New Chat"
+    # The shared store may be a SQLite file, so its calls run off the event loop
+    return await asyncio.to_thread(chatbot.create_chat_session, str(current_user.id), title)
+
+@router.get("/history", response_model=schemas.ChatHistory)
+async def get_history(
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Get chat history for the current user, streamed one session at a time"""
+    user_id = str(current_user.id)
+    return stream_json_object(
+        {"user_id": user_id}, "sessions", chatbot.iter_chat_sessions(user_id, offset, limit)
+    )
+
+@router.post("/{session_id}/messages", response_model=schemas.ChatSessionReply)
+async def send_message(
+    session_id: str,
+    content: str = Form(...),
+    image: Optional[UploadFile] = File(None),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Send a message in a chat session"""
+    user_id = str(current_user.id)
+    # Check before paying for model calls; the append below re-checks atomically
+    if not await asyncio.to_thread(chatbot.has_chat_session, user_id, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    try:
+        image_data = await image.read() if image else None
+        user_profile = await asyncio.to_thread(get_user_profile, db, current_user.id)
+        planning_analysis, final_analysis, response = await run_chat(
+            current_user.id, content, user_profile, image_data
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Chat error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+    session = await asyncio.to_thread(chatbot.append_chat_messages, user_id, session_id, [
+        Message(content=content, role="user"),
+        Message(content=response, role="assistant"),
+    ])
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    return FastJSONResponse(schemas.ChatSessionReply.model_construct(
+        session=session,
+        planning_analysis=planning_analysis,
+        final_analysis=final_analysis,
+        response=response,
+    ))
+
+@router.delete("/sessions/{session_id}")
+async def delete_session(
+    session_id: str,
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Delete a chat session"""
+    success = await asyncio.to_thread(chatbot.delete_chat_session, str(current_user.id), session_id)
+    return {"status": "success" if success else "failed"}
@@ -0,0 +1,213 @@
+from fastapi import APIRouter, HTTPException, Depends, status
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+from sqlalchemy import insert
+import models
+import schemas
+import auth
+import chatbot
+from database import SessionLocal
+from batch_writer import BatchWriter
+from routes.subjects import load_subjects
+
+router = APIRouter()
+
+# Cards generated per topic
+DECK_SIZE = 10
+
+# One generation per topic at a time in this process, so concurrent first visits share a
+# single model call; store_deck keeps workers from storing a topic twice
+_deck_locks: Dict[str, asyncio.Lock] = {}
+
+def sm2(ease_factor: float, interval_days: int, repetitions: int, quality: int) -> Tuple[float, int, int]:
+    """Apply one SM-2 review and return the new (ease factor, interval, repetitions)"""
+    if quality < 3:
+        repetitions = 0
+        interval_days = 1
+    else:
+        if repetitions == 0:
+            interval_days = 1
+        elif repetitions == 1:
+            interval_days = 6
+        else:
+            interval_days = round(interval_days * ease_factor)
+        repetitions += 1
+    ease_factor = max(1.3, ease_factor + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return ease_factor, interval_days, repetitions
+
+def _card_dict(card: models.Flashcard) -> dict:
+    return {"id": card.id, "topic": card.topic, "front": card.front, "back": card.back}
+
+def load_deck(topic: str) -> List[dict]:
+    db = SessionLocal()
+    try:
+        cards = db.query(models.Flashcard).filter(
+            models.Flashcard.topic == topic
+        ).order_by(models.Flashcard.id).all()
+        return [_card_dict(card) for card in cards]
+    finally:
+        db.close()
+
+def store_deck(topic: str, generated: List[Dict[str, str]]) -> List[dict]:
+    """Store a generated deck, or return the one another worker stored first"""
+    db = SessionLocal()
+    try:
+        # Take the write lock before re-checking, so concurrent workers store a topic's deck once
+        db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+        existing = db.query(models.Flashcard).filter(
+            models.Flashcard.topic == topic
+        ).order_by(models.Flashcard.id).all()
+        if existing:
+            db.rollback()
+            return [_card_dict(card) for card in existing]
+        cards = [models.Flashcard(topic=topic, front=card["front"], back=card["back"]) for card in generated]
+        db.add_all(cards)
+        db.commit()
+        return [_card_dict(card) for card in cards]
+    finally:
+        db.close()
+
+def known_topics() -> set:
+    return {subject['subcategory'] for subject in load_subjects() if subject.get('subcategory')}
+
+async def ensure_deck(topic: str) -> List[dict]:
+    """Return the stored deck for a topic, generating it through the model the first time"""
+    cards = await asyncio.to_thread(load_deck, topic)
+    if cards:
+        return cards
+
+    lock = _deck_locks.setdefault(topic, asyncio.Lock())
+    async with lock:
+        cards = await asyncio.to_thread(load_deck, topic)
+        if cards:
+            return cards
+        generated = await chatbot.generate_flashcards(topic, DECK_SIZE)
+        if not generated:
+            raise ValueError(f"No flashcards were generated for {topic}")
+        return await asyncio.to_thread(store_deck, topic, generated)
+
+def enroll(user_id: int, flashcard_ids: List[int]):
+    """Schedule any of these cards the user has not seen yet as due now"""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        # OR IGNORE skips cards already scheduled, including by a concurrent request for the same deck
+        db.execute(insert(models.FlashcardSchedule).prefix_with("OR IGNORE"), [
+            {"user_id": user_id, "flashcard_id": flashcard_id, "ease_factor": 2.5,
+             "interval_days": 0, "repetitions": 0, "due_at": now}
+            for flashcard_id in flashcard_ids
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+def load_due(user_id: int, now: datetime, limit: int) -> List[dict]:
+    db = SessionLocal()
+    try:
+        rows = db.query(models.FlashcardSchedule, models.Flashcard).join(
+            models.Flashcard, models.FlashcardSchedule.flashcard_id == models.Flashcard.id
+        ).filter(
+            models.FlashcardSchedule.user_id == user_id,
+            models.FlashcardSchedule.due_at <= now
+        ).order_by(models.FlashcardSchedule.due_at).limit(limit).all()
+        return [
+            {**_card_dict(card), "due_at": schedule.due_at,
+             "repetitions": schedule.repetitions, "interval_days": schedule.interval_days}
+            for schedule, card in rows
+        ]
+    finally:
+        db.close()
+
+def is_enrolled(user_id: int, flashcard_id: int) -> bool:
+    db = SessionLocal()
+    try:
+        return db.query(models.FlashcardSchedule.id).filter(
+            models.FlashcardSchedule.user_id == user_id,
+            models.FlashcardSchedule.flashcard_id == flashcard_id
+        ).first() is not None
+    finally:
+        db.close()
+
+def write_reviews(events: List[dict]):
+    """Apply a batch of reviews to the SM-2 schedules in one transaction"""
+    db = SessionLocal()
+    try:
+        user_ids = {event["user_id"] for event in events}
+        flashcard_ids = {event["flashcard_id"] for event in events}
+        schedules = {
+            (schedule.user_id, schedule.flashcard_id): schedule
+            for schedule in db.query(models.FlashcardSchedule).filter(
+                models.FlashcardSchedule.user_id.in_(user_ids),
+                models.FlashcardSchedule.flashcard_id.in_(flashcard_ids)
+            )
+        }
+        # Events are in arrival order, so repeated reviews of a card apply in sequence
+        for event in events:
+            schedule = schedules.get((event["user_id"], event["flashcard_id"]))
+            # Only cards the user is enrolled in have a schedule; SQLite does not enforce the foreign key
+            if schedule is None:
+                continue
+            schedule.ease_factor, schedule.interval_days, schedule.repetitions = sm2(
+                schedule.ease_factor, schedule.interval_days, schedule.repetitions, event["quality"]
+            )
+            schedule.last_reviewed_at = event["reviewed_at"]
+            schedule.due_at = event["reviewed_at"] + timedelta(days=schedule.interval_days)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+# Reviews are applied in batches; a short interval keeps "due" lists close to current
+review_events = BatchWriter("Flashcard reviews", write_reviews, interval=2.0)
+
+@router.get("/decks/{topic}", response_model=List[schemas.Flashcard])
+async def get_deck(
+    topic: str,
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Get a topic's deck, generating it once if needed, and add it to the user's reviews"""
+    if topic not in await asyncio.to_thread(known_topics):
+        raise HTTPException(status_code=404, detail=f"Unknown topic: {topic}")
+    try:
+        cards = await ensure_deck(topic)
+    except Exception as e:
+        print(f"Flashcard generation error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="Failed to generate flashcards"
+        )
+    await asyncio.to_thread(enroll, current_user.id, [card["id"] for card in cards])
+    return cards
+
+@router.get("/due", response_model=List[schemas.DueFlashcard])
+async def get_due_cards(
+    limit: int = 20,
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Cards due for review now, most overdue first"""
+    # Cards reviewed since the last flush are still due in the database; leave them out
+    pending = {
+        event["flashcard_id"] for event in review_events.buffer
+        if event["user_id"] == current_user.id
+    }
+    cards = await asyncio.to_thread(load_due, current_user.id, datetime.utcnow(), limit + len(pending))
+    return [card for card in cards if card["id"] not in pending][:limit]
+
+@router.post("/reviews", status_code=status.HTTP_202_ACCEPTED)
+async def submit_review(
+    review: schemas.FlashcardReviewCreate,
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Queue a review; the schedule is updated with the next batch"""
+    if not await asyncio.to_thread(is_enrolled, current_user.id, review.flashcard_id):
+        raise HTTPException(status_code=404, detail="Flashcard not found in your reviews")
+    review_events.add({
+        "user_id": current_user.id,
+        "flashcard_id": review.flashcard_id,
+        "quality": review.quality,
+        "reviewed_at": datetime.utcnow(),
+    })
+    return {"status": "queued"}
@@ -1,23 +1,40 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 import json
+import os
 from typing import List, Dict
+from http_cache import make_etag, conditional_response
 
 router = APIRouter()
 
+SUBJECTS_FILE = 'subjects.json'
+
+def subjects_etag(*parts) -> str:
+    """ETag that changes whenever subjects.json does, without reading it"""
+    stat = os.stat(SUBJECTS_FILE)
+    return make_etag(stat.st_mtime_ns, stat.st_size, *parts)
+
 def load_subjects():
-    with open('subjects.json', 'r') as f:
+    with open(SUBJECTS_FILE, 'r') as f:
         data = json.load(f)
         return data.get('subjects', [])
 
-@router.get("/categories")
-def get_categories() -> List[str]:
+@router.get("/categories", response_model=List[str])
+def get_categories(request: Request):
+    return conditional_response(request, subjects_etag("categories"), list_categories)
+
+def list_categories() -> List[str]:
     subjects = load_subjects()
     # Get unique categories
     categories = list(set(subject['category'] for subject in subjects))
     return sorted(categories)
 
-@router.get("/subcategories/{category}")
-def get_subcategories(category: str) -> List[str]:
+@router.get("/subcategories/{category}", response_model=List[str])
+def get_subcategories(category: str, request: Request):
+    return conditional_response(
+        request, subjects_etag("subcategories", category), lambda: list_subcategories(category)
+    )
+
+def list_subcategories(category: str) -> List[str]:
     subjects = load_subjects()
     # Get unique subcategories for the given category
     subcategories = list(set(
@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends, status
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy import or_
+import models
+import auth
+from database import SessionLocal
+from batch_writer import BatchWriter
+
+router = APIRouter()
+
+def write_view_events(events: List[dict]):
+    """Insert view rows and bump last_viewed_at once per tutorial in a single transaction"""
+    db = SessionLocal()
+    try:
+        # Views of tutorials that do not exist are dropped; SQLite does not enforce the foreign key
+        known = {
+            tutorial_id for (tutorial_id,) in db.query(models.Tutorial.id).filter(
+                models.Tutorial.id.in_({event["tutorial_id"] for event in events})
+            )
+        }
+        events = [event for event in events if event["tutorial_id"] in known]
+        if not events:
+            return
+
+        latest: Dict[int, datetime] = {}
+        for event in events:
+            tutorial_id = event["tutorial_id"]
+            if tutorial_id not in latest or event["viewed_at"] > latest[tutorial_id]:
+                latest[tutorial_id] = event["viewed_at"]
+
+        db.bulk_insert_mappings(models.UserTutorialHistory, events)
+        for tutorial_id, viewed_at in latest.items():
+            db.query(models.Tutorial).filter(
+                models.Tutorial.id == tutorial_id,
+                or_(models.Tutorial.last_viewed_at.is_(None), models.Tutorial.last_viewed_at < viewed_at)
+            ).update({"last_viewed_at": viewed_at}, synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+# View events are written in batches so browsing never waits on the single SQLite writer
+view_events = BatchWriter("View history", write_view_events)
+
+@router.post("/{tutorial_id}/views", status_code=status.HTTP_202_ACCEPTED)
+async def record_view(
+    tutorial_id: int,
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Queue a tutorial view; it is written with the next batch"""
+    view_events.add({
+        "user_id": current_user.id,
+        "tutorial_id": tutorial_id,
+        "viewed_at": datetime.utcnow(),
+    })
+    return {"status": "queued"}
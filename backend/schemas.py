@@ -1,7 +1,11 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
 from datetime import datetime, date
 
+def trusted(schema, obj):
+    """Build a response schema from an ORM row without re-validating its fields"""
+    return schema.model_construct(**{name: getattr(obj, name) for name in schema.model_fields})
+
 class UserBase(BaseModel):
     username: str
     email: str
@@ -22,6 +26,10 @@ class UserLogin(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class TokenRefresh(BaseModel):
+    refresh_token: str
 
 class LearningProfileBase(BaseModel):
     verbal_score: Optional[float] = None
@@ -56,6 +64,32 @@ class ChatMessageResponse(ChatMessageBase):
     class Config:
         from_attributes = True
 
+class Message(BaseModel):
+    content: str
+    role: str
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    image_url: Optional[str] = None
+
+class ChatSession(BaseModel):
+    id: str
+    title: str
+    messages: List[Message] = []
+    created_at: datetime
+    updated_at: datetime
+
+class ChatHistory(BaseModel):
+    sessions: List[ChatSession] = []
+    user_id: str
+
+class ChatSessionCreate(BaseModel):
+    title: Optional[str] = None
+
+class ChatSessionReply(BaseModel):
+    session: ChatSession
+    planning_analysis: str
+    final_analysis: str
+    response: str
+
 class UserWithProfile(User):
     learning_profile: Optional[LearningProfile] = None
     chat_messages: List[ChatMessageResponse] = []
@@ -124,4 +158,22 @@ class SubjectCategoryScore(BaseModel):
     chemistry: float
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class Flashcard(BaseModel):
+    id: int
+    topic: str
+    front: str
+    back: str
+
+    class Config:
+        from_attributes = True
+
+class DueFlashcard(Flashcard):
+    due_at: datetime
+    repetitions: int
+    interval_days: int
+
+class FlashcardReviewCreate(BaseModel):
+    flashcard_id: int
+    quality: int = Field(ge=0, le=5)  # SM-2 recall grade, 0 (blackout) to 5 (perfect)
@@ -0,0 +1,140 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# "memory" keeps state in this process; "sqlite:<path>" shares it between workers on one host
+SHARED_STATE = os.getenv("SHARED_STATE", "memory")
+
+class MemoryStore:
+    """Namespaced key/value state kept in this process"""
+
+    def __init__(self):
+        self._data: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        return self._data.get(namespace, {}).get(key)
+
+    def contains(self, namespace: str, key: str) -> bool:
+        return key in self._data.get(namespace, {})
+
+    def set(self, namespace: str, key: str, value: Any):
+        with self._lock:
+            self._data.setdefault(namespace, {})[key] = value
+
+    def set_many(self, namespace: str, values: Dict[str, Any]):
+        with self._lock:
+            self._data.setdefault(namespace, {}).update(values)
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._data.get(namespace, {}).pop(key, None)
+
+    def items(self, namespace: str) -> Dict[str, Any]:
+        return dict(self._data.get(namespace, {}))
+
+    def update(self, namespace: str, key: str, fn: Callable[[Optional[Any]], Any]) -> Any:
+        """Atomically replace a value with fn(old value) and return the new value"""
+        with self._lock:
+            values = self._data.setdefault(namespace, {})
+            values[key] = fn(values.get(key))
+            return values[key]
+
+class SQLiteConnections:
+    """One reused connection per thread to a SQLite file shared by every process on the host"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            # WAL lets readers run alongside the writer, and with it NORMAL only fsyncs at
+            # checkpoints; a power cut may lose the last commits but never corrupts the file
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """Run a write transaction that takes the write lock up front, so concurrent writers serialize"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+class SQLiteStore(SQLiteConnections):
+    """Namespaced key/value state in a SQLite file, shared by every process on the host"""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS shared_state "
+            "(namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        row = self._connect().execute(
+            "SELECT value FROM shared_state WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def contains(self, namespace: str, key: str) -> bool:
+        return self._connect().execute(
+            "SELECT 1 FROM shared_state WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone() is not None
+
+    def set(self, namespace: str, key: str, value: Any):
+        self.set_many(namespace, {key: value})
+
+    def set_many(self, namespace: str, values: Dict[str, Any]):
+        with self._write() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO shared_state (namespace, key, value) VALUES (?, ?, ?)",
+                [(namespace, key, json.dumps(value)) for key, value in values.items()]
+            )
+
+    def delete(self, namespace: str, key: str):
+        self._connect().execute("DELETE FROM shared_state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def items(self, namespace: str) -> Dict[str, Any]:
+        rows = self._connect().execute(
+            "SELECT key, value FROM shared_state WHERE namespace = ?", (namespace,)
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def update(self, namespace: str, key: str, fn: Callable[[Optional[Any]], Any]) -> Any:
+        """Atomically replace a value with fn(old value) and return the new value"""
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT value FROM shared_state WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            value = fn(json.loads(row[0]) if row else None)
+            conn.execute(
+                "INSERT OR REPLACE INTO shared_state (namespace, key, value) VALUES (?, ?, ?)",
+                (namespace, key, json.dumps(value))
+            )
+            return value
+
+_store = None
+
+def get_store():
+    """Return the process-wide store selected by SHARED_STATE"""
+    global _store
+    if _store is None:
+        if SHARED_STATE.startswith("sqlite:"):
+            _store = SQLiteStore(SHARED_STATE[len("sqlite:"):])
+        else:
+            _store = MemoryStore()
+    return _store
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the backend's flat modules the way main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# auth refuses to start without signing keys
+os.environ.setdefault("JWT_SIGNING_KEYS", "test:" + "0" * 64)
+
+@pytest.fixture
+def scratch_db(tmp_path, monkeypatch):
+    """Point every session at a migrated scratch database; cache files are written to the working directory"""
+    from sqlalchemy import create_engine
+    import migrate
+    from database import engine, SessionLocal
+
+    monkeypatch.chdir(tmp_path)
+    test_engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    migrate.upgrade(test_engine)
+    SessionLocal.configure(bind=test_engine)
+    yield test_engine
+    SessionLocal.configure(bind=engine)
+    test_engine.dispose()
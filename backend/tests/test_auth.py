@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+import pytest
+from jose import JWTError, jwt
+
+import auth
+
+@pytest.fixture
+def keys(monkeypatch):
+    """Start each test with a single key "k1" and an empty verified-token cache"""
+    monkeypatch.setattr(auth, "SIGNING_KEYS", {"k1": "secret-one"})
+    monkeypatch.setattr(auth, "ACTIVE_KID", "k1")
+    auth._verified_tokens.clear()
+    yield
+    auth._verified_tokens.clear()
+
+def rotate(monkeypatch, keys: dict):
+    monkeypatch.setattr(auth, "SIGNING_KEYS", keys)
+    monkeypatch.setattr(auth, "ACTIVE_KID", next(iter(keys)))
+    auth._verified_tokens.clear()
+
+def test_access_token_round_trip(keys):
+    token = auth.create_access_token({"sub": "student"})
+    assert jwt.get_unverified_header(token)["kid"] == "k1"
+    assert auth.decode_token(token)["sub"] == "student"
+    assert auth.get_token_subject(token) == "student"
+
+def test_token_types_are_not_interchangeable(keys):
+    refresh = auth.create_refresh_token({"sub": "student"})
+    access = auth.create_access_token({"sub": "student"})
+    assert auth.decode_token(refresh, "refresh")["sub"] == "student"
+    with pytest.raises(JWTError):
+        auth.decode_token(refresh)
+    with pytest.raises(JWTError):
+        auth.decode_token(access, "refresh")
+    assert auth.get_token_subject(refresh) is None
+
+def test_untyped_legacy_token_is_an_access_token(keys):
+    expire = datetime.utcnow() + timedelta(minutes=5)
+    token = jwt.encode({"sub": "student", "exp": expire}, "secret-one", algorithm=auth.ALGORITHM, headers={"kid": "k1"})
+    assert auth.decode_token(token)["sub"] == "student"
+    with pytest.raises(JWTError):
+        auth.decode_token(token, "refresh")
+
+def test_rotation_keeps_old_tokens_valid_until_the_key_is_dropped(keys, monkeypatch):
+    old_token = auth.create_access_token({"sub": "student"})
+
+    rotate(monkeypatch, {"k2": "secret-two", "k1": "secret-one"})
+    new_token = auth.create_access_token({"sub": "student"})
+    assert jwt.get_unverified_header(new_token)["kid"] == "k2"
+    assert auth.decode_token(old_token)["sub"] == "student"
+    assert auth.decode_token(new_token)["sub"] == "student"
+
+    rotate(monkeypatch, {"k2": "secret-two"})
+    with pytest.raises(JWTError):
+        auth.decode_token(old_token)
+    assert auth.decode_token(new_token)["sub"] == "student"
+
+def test_token_signed_with_another_secret_is_rejected(keys):
+    expire = datetime.utcnow() + timedelta(minutes=5)
+    forged = jwt.encode(
+        {"sub": "student", "exp": expire, "type": "access"}, "not-the-secret",
+        algorithm=auth.ALGORITHM, headers={"kid": "k1"}
+    )
+    with pytest.raises(JWTError):
+        auth.decode_token(forged)
+    assert auth.get_token_subject(forged) is None
+
+def test_expired_token_is_rejected(keys):
+    token = auth.create_access_token({"sub": "student"}, expires_delta=timedelta(seconds=-1))
+    with pytest.raises(JWTError):
+        auth.decode_token(token)
+
+def test_missing_signing_keys_fail_loudly(monkeypatch):
+    monkeypatch.delenv("JWT_SIGNING_KEYS", raising=False)
+    with pytest.raises(RuntimeError):
+        auth.load_signing_keys()
@@ -0,0 +1,57 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import auth
+import chatbot
+import models
+import usage
+from database import SessionLocal
+from loop_monitor import detect_blocking
+from main import app
+
+class StubModel:
+    """Answers every prompt after a short await, like the real model minus the network"""
+
+    async def generate_content_async(self, prompt, **kwargs):
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(text="Stub response.", usage_metadata=None)
+
+@pytest.fixture
+def token(scratch_db, monkeypatch):
+    db = SessionLocal()
+    db.add(models.User(username="student", email="student@example.com", hashed_password="unused"))
+    db.commit()
+    db.close()
+
+    monkeypatch.setattr(chatbot, "_model", StubModel())
+    return auth.create_access_token({"sub": "student"})
+
+async def exercise(headers: dict):
+    # TestClient would run the app on another thread's loop; ASGITransport keeps it on this one
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        usage.usage_events.start()
+        try:
+            async with detect_blocking():
+                response = await client.post("/chat", data={"message": "What is a derivative?"}, headers=headers)
+                assert response.status_code == 200, response.text
+
+                response = await client.post("/chat/sessions", json={"title": "Calculus"}, headers=headers)
+                assert response.status_code == 200, response.text
+                session_id = response.json()["id"]
+
+                response = await client.post(
+                    f"/chat/{session_id}/messages", data={"content": "What is an integral?"}, headers=headers
+                )
+                assert response.status_code == 200, response.text
+
+                response = await client.post("/api/cache/explanation/Calculus", json={"explanation": "Rates of change."})
+                assert response.status_code == 200, response.text
+        finally:
+            await usage.usage_events.stop()
+
+def test_chat_and_cache_handlers_do_not_block_the_event_loop(token):
+    asyncio.run(exercise({"Authorization": f"Bearer {token}"}))
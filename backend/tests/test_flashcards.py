@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+import models
+from database import SessionLocal
+from routes import flashcards
+
+def test_sm2_first_reviews_follow_fixed_intervals():
+    state = (2.5, 0, 0)
+    state = flashcards.sm2(*state, quality=5)
+    assert state[1:] == (1, 1)
+    state = flashcards.sm2(*state, quality=5)
+    assert state[1:] == (6, 2)
+    ease_factor = state[0]
+    state = flashcards.sm2(*state, quality=5)
+    assert state[1:] == (round(6 * ease_factor), 3)
+
+def test_sm2_ease_factor_moves_with_quality():
+    assert flashcards.sm2(2.5, 6, 2, quality=5)[0] == pytest.approx(2.6)
+    assert flashcards.sm2(2.5, 6, 2, quality=4)[0] == pytest.approx(2.5)
+    assert flashcards.sm2(2.5, 6, 2, quality=3)[0] == pytest.approx(2.36)
+
+def test_sm2_lapse_resets_repetitions():
+    ease_factor, interval_days, repetitions = flashcards.sm2(2.5, 15, 4, quality=2)
+    assert (interval_days, repetitions) == (1, 0)
+    assert ease_factor == pytest.approx(2.18)
+
+def test_sm2_ease_factor_never_drops_below_1_3():
+    state = (1.4, 1, 0)
+    for _ in range(5):
+        state = flashcards.sm2(*state, quality=0)
+    assert state[0] == pytest.approx(1.3)
+
+def store_cards(count: int):
+    return [card["id"] for card in flashcards.store_deck("Algebra", [
+        {"front": f"Q{i}", "back": f"A{i}"} for i in range(count)
+    ])]
+
+def schedules():
+    db = SessionLocal()
+    try:
+        return db.query(models.FlashcardSchedule).order_by(models.FlashcardSchedule.flashcard_id).all()
+    finally:
+        db.close()
+
+def test_concurrent_enrollment_schedules_each_card_once(scratch_db):
+    card_ids = store_cards(5)
+    with ThreadPoolExecutor(6) as pool:
+        list(pool.map(lambda _: flashcards.enroll(1, card_ids), range(6)))
+    assert [schedule.flashcard_id for schedule in schedules()] == card_ids
+
+def test_reviews_update_enrolled_cards_and_skip_others(scratch_db):
+    card_ids = store_cards(2)
+    flashcards.enroll(1, card_ids[:1])
+    now = datetime.utcnow()
+    flashcards.write_reviews([
+        {"user_id": 1, "flashcard_id": card_ids[0], "quality": 5, "reviewed_at": now},
+        {"user_id": 1, "flashcard_id": card_ids[1], "quality": 5, "reviewed_at": now},
+        {"user_id": 1, "flashcard_id": 424242, "quality": 5, "reviewed_at": now},
+    ])
+    [schedule] = schedules()
+    assert (schedule.flashcard_id, schedule.repetitions, schedule.interval_days) == (card_ids[0], 1, 1)
+    assert flashcards.is_enrolled(1, card_ids[0])
+    assert not flashcards.is_enrolled(1, card_ids[1])
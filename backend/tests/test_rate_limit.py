@@ -0,0 +1,67 @@
+import pytest
+
+import rate_limit
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+def test_bucket_allows_capacity_then_reports_wait(clock):
+    store = rate_limit.MemoryBucketStore()
+    assert store.take("ip:a", 6, capacity=10, rate=2) == 0
+    # 4 tokens left; 6 more need 1 second at 2 tokens per second
+    assert store.take("ip:a", 6, capacity=10, rate=2) == pytest.approx(1.0)
+    # Other clients have their own bucket
+    assert store.take("ip:b", 10, capacity=10, rate=2) == 0
+
+def test_bucket_refills_over_time_up_to_capacity(clock):
+    store = rate_limit.MemoryBucketStore()
+    assert store.take("ip:a", 10, capacity=10, rate=2) == 0
+    clock.now += 2
+    assert store.take("ip:a", 4, capacity=10, rate=2) == 0
+    assert store.take("ip:a", 1, capacity=10, rate=2) > 0
+    # A long idle period refills to capacity, not beyond it
+    clock.now += 3600
+    assert store.take("ip:a", 10, capacity=10, rate=2) == 0
+    assert store.take("ip:a", 1, capacity=10, rate=2) > 0
+
+def test_rejected_request_is_not_charged(clock):
+    store = rate_limit.MemoryBucketStore()
+    store.take("ip:a", 8, capacity=10, rate=1)
+    assert store.take("ip:a", 8, capacity=10, rate=1) == pytest.approx(6.0)
+    clock.now += 6
+    assert store.take("ip:a", 8, capacity=10, rate=1) == 0
+
+def test_sweep_forgets_only_refilled_buckets(clock):
+    store = rate_limit.MemoryBucketStore()
+    store.take("ip:idle", 5, capacity=10, rate=0.1)
+    clock.now += rate_limit.SWEEP_INTERVAL - 30
+    store.take("ip:busy", 10, capacity=10, rate=0.1)
+    clock.now += 30
+    # Sweeps on this call: ip:idle has refilled, ip:busy has only 3 of its 10 tokens back
+    store.take("ip:new", 1, capacity=10, rate=0.1)
+    assert set(store._buckets) == {"ip:busy", "ip:new"}
+
+@pytest.mark.parametrize("method, path, cost", [
+    ("POST", "/chat", 8),
+    ("POST", "/chat/3f2c9a/messages", 8),
+    ("GET", "/api/flashcards/decks/Linear Algebra", 8),
+    ("POST", "/login", 10),
+    ("POST", "/signup", 10),
+    ("POST", "/chat/sessions", rate_limit.DEFAULT_COST),
+    ("GET", "/chat", rate_limit.DEFAULT_COST),
+    ("GET", "/api/flashcards/decks/a/b", rate_limit.DEFAULT_COST),
+    ("POST", "/chat/3f2c9a/messages/extra", rate_limit.DEFAULT_COST),
+    ("POST", "/login/", rate_limit.DEFAULT_COST),
+])
+def test_route_cost_matches_route_templates(method, path, cost):
+    assert rate_limit.route_cost(method, path) == cost
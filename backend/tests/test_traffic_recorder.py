@@ -0,0 +1,40 @@
+import asyncio
+import json
+
+import traffic_recorder
+
+def test_anonymize_query_scrubs_contact_details():
+    query = "I'm at priya@example.com or 555-123-4567, +44 (20) 7946 0958, id 12345678"
+    assert traffic_recorder.anonymize_query(query) == "I'm at <email> or <phone>, <phone>, id <number>"
+
+def test_anonymize_query_keeps_arithmetic():
+    query = "Why is 3 - 4 - 5 = -6 and 12 * 12 = 144?"
+    assert traffic_recorder.anonymize_query(query) == query
+
+def record(tmp_path, monkeypatch, queries: bool) -> dict:
+    path = tmp_path / "rec.jsonl"
+    monkeypatch.setattr(traffic_recorder, "CHAT_RECORDING", str(path))
+    monkeypatch.setattr(traffic_recorder, "CHAT_RECORDING_QUERIES", queries)
+    query = "Priya Sharma, 42 Park Street, 555-123-4567: what is a derivative?"
+    asyncio.run(traffic_recorder.record_chat(query, None, "v1:default", b"image", 0.0, 0.5, 200))
+    return json.loads(path.read_text())
+
+def test_recording_keeps_only_the_query_shape_by_default(tmp_path, monkeypatch):
+    entry = record(tmp_path, monkeypatch, queries=False)
+    assert "query" not in entry
+    assert "Priya" not in json.dumps(entry)
+    assert entry["query_words"] == 10
+    assert entry["image_size"] == 5
+
+def test_query_text_is_recorded_only_when_enabled(tmp_path, monkeypatch):
+    entry = record(tmp_path, monkeypatch, queries=True)
+    # Names and addresses are not removed, which is why this is opt-in
+    assert entry["query"] == "Priya Sharma, 42 Park Street, <phone>: what is a derivative?"
+
+def test_responses_are_recorded_only_with_query_text(monkeypatch):
+    model = object()
+    monkeypatch.setattr(traffic_recorder, "CHAT_RECORDING", "rec.jsonl")
+    monkeypatch.setattr(traffic_recorder, "CHAT_RECORDING_QUERIES", False)
+    assert traffic_recorder.wrap_model(model) is model
+    monkeypatch.setattr(traffic_recorder, "CHAT_RECORDING_QUERIES", True)
+    assert isinstance(traffic_recorder.wrap_model(model), traffic_recorder.RecordingModel)
@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from typing import Any, Optional
+
+# Path of a JSONL file to record /chat traffic into; recording is off when unset
+CHAT_RECORDING = os.getenv("CHAT_RECORDING")
+
+# By default only the shape of each query is recorded. Set to 1 to also record the query
+# text and the model's responses, after anonymize_query; see its limits before turning it on
+CHAT_RECORDING_QUERIES = os.getenv("CHAT_RECORDING_QUERIES", "0") == "1"
+
+# Salt for query and image hashes; set it so hashes from different workers or runs can be compared
+RECORDING_SALT = os.getenv("CHAT_RECORDING_SALT") or secrets.token_hex(16)
+
+# Model responses are recorded next to the traffic so replay can serve them back
+RESPONSES_SUFFIX = ".responses"
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_PHONE = re.compile(r"\+?\(?\d[\d\s().-]{5,}\d")
+_LONG_NUMBER = re.compile(r"\d{6,}")
+
+_write_lock = threading.Lock()
+_recording_started = time.time()
+
+def _scrub_phone(match: re.Match) -> str:
+    # Short runs such as "3 - 4 - 5" are arithmetic, not phone numbers
+    return "<phone>" if sum(c.isdigit() for c in match.group()) >= 7 else match.group()
+
+def anonymize_query(query: str) -> str:
+    """Replace emails, phone numbers and long digit runs with placeholders.
+
+    This is pattern matching only: names, street addresses and anything else
+    identifying in free text are NOT removed.
+    """
+    query = _EMAIL.sub("<email>", query)
+    query = _LONG_NUMBER.sub("<number>", query)
+    return _PHONE.sub(_scrub_phone, query)
+
+def salted_hash(data: bytes) -> str:
+    return hmac.new(RECORDING_SALT.encode("utf-8"), data, hashlib.sha256).hexdigest()
+
+def prompt_hash(prompt: Any) -> str:
+    """Stable hash of a model prompt, which may be text or a list of text and image parts.
+
+    Text is anonymized first, so a prompt built from a recorded (anonymized) query
+    hashes the same as the original prompt did.
+    """
+    digest = hashlib.sha256()
+    parts = prompt if isinstance(prompt, list) else [prompt]
+    for part in parts:
+        if isinstance(part, dict) and "data" in part:
+            digest.update(part["data"])
+        else:
+            digest.update(anonymize_query(str(part)).encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+def _append(path: str, record: dict):
+    line = json.dumps(record) + "\n"
+    with _write_lock:
+        with open(path, "a") as f:
+            f.write(line)
+
+async def record_chat(
+    query: str,
+    subcategory: Optional[str],
+    bucket: str,
+    image_data: Optional[bytes],
+    started: float,
+    duration: float,
+    status: int
+):
+    """Append the shape of one /chat request to the recording.
+
+    subcategory is set when the query is the resources page's explanation question,
+    whose text carries nothing about the student.
+    """
+    if not CHAT_RECORDING:
+        return
+    record = {
+        "offset": round(started - _recording_started, 3),
+        "query_chars": len(query),
+        "query_words": len(query.split()),
+        "query_hash": salted_hash(query.encode("utf-8")),
+        "subcategory": subcategory,
+        "bucket": bucket,
+        "image_hash": salted_hash(image_data) if image_data else None,
+        "image_size": len(image_data) if image_data else 0,
+        "duration_ms": round(duration * 1000, 1),
+        "status": status,
+    }
+    if CHAT_RECORDING_QUERIES:
+        record["query"] = anonymize_query(query)
+    await asyncio.to_thread(_append, CHAT_RECORDING, record)
+
+class RecordingModel:
+    """Wraps the Gemini model and records each response, keyed by prompt hash, for replay.
+
+    Responses often quote the query, so their text is anonymized the same way.
+    """
+
+    def __init__(self, model, path: str):
+        self.model = model
+        self.path = path
+
+    async def generate_content_async(self, prompt, **kwargs):
+        started = time.perf_counter()
+        response = await self.model.generate_content_async(prompt, **kwargs)
+        record = {
+            "prompt_sha256": prompt_hash(prompt),
+            "text": anonymize_query(response.text),
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        await asyncio.to_thread(_append, self.path, record)
+        return response
+
+def wrap_model(model):
+    """Record model responses too when traffic recording includes query text"""
+    # Responses quote the query, so they are only kept when query text is
+    if not CHAT_RECORDING or not CHAT_RECORDING_QUERIES:
+        return model
+    return RecordingModel(model, CHAT_RECORDING + RESPONSES_SUFFIX)
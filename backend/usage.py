@@ -0,0 +1,118 @@
+import asyncio
+import os
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, or_
+import models
+from batch_writer import BatchWriter
+from database import SessionLocal
+
+# Daily model tokens per user; 0 disables budget enforcement
+DAILY_TOKEN_BUDGET = int(os.getenv("DAILY_TOKEN_BUDGET", "200000"))
+
+# Past this share of the budget, users get the cheaper single-call pipeline
+REDUCED_AT = float(os.getenv("BUDGET_REDUCED_AT", "0.8"))
+
+# Budget modes, from least to most restricted
+FULL = "full"
+REDUCED = "reduced"
+EXHAUSTED = "exhausted"
+
+# User whose request is making model calls; unset for system work like cache warm-up
+current_user: ContextVar[Optional[int]] = ContextVar("usage_current_user", default=None)
+
+def write_usage(events: List[dict]):
+    """Add a batch of model calls to the per-user, per-stage, per-day ledger in one transaction"""
+    totals: Dict[Tuple[Optional[int], str, date], List[int]] = {}
+    for event in events:
+        key = (event["user_id"], event["stage"], event["day"])
+        row = totals.setdefault(key, [0, 0, 0, 0])
+        row[0] += 1
+        row[1] += event["prompt_tokens"]
+        row[2] += event["output_tokens"]
+        row[3] += event["total_tokens"]
+
+    user_ids = {user_id for user_id, _, _ in totals if user_id is not None}
+    days = {day for _, _, day in totals}
+    db = SessionLocal()
+    try:
+        existing = {
+            (row.user_id, row.stage, row.day): row
+            for row in db.query(models.ModelUsage).filter(
+                models.ModelUsage.day.in_(days),
+                or_(models.ModelUsage.user_id.in_(user_ids), models.ModelUsage.user_id.is_(None))
+            )
+        }
+        for key, (calls, prompt_tokens, output_tokens, total_tokens) in totals.items():
+            row = existing.get(key)
+            if row is None:
+                user_id, stage, day = key
+                row = models.ModelUsage(
+                    user_id=user_id, stage=stage, day=day,
+                    calls=0, prompt_tokens=0, output_tokens=0, total_tokens=0
+                )
+                db.add(row)
+            row.calls += calls
+            row.prompt_tokens += prompt_tokens
+            row.output_tokens += output_tokens
+            row.total_tokens += total_tokens
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+usage_events = BatchWriter("Model usage", write_usage)
+
+def record(stage: str, response):
+    """Log the usage_metadata of one generate_content_async response"""
+    # Nothing would flush the events, e.g. in the replay harness
+    if not usage_events.running:
+        return
+    metadata = getattr(response, "usage_metadata", None)
+    # Accounting must never fail a chat turn, so drop the event rather than raise when full
+    if len(usage_events.buffer) >= usage_events.max_buffer:
+        print(f"Dropping model usage event for stage {stage}: buffer is full")
+        return
+    usage_events.add({
+        "user_id": current_user.get(),
+        "stage": stage,
+        "day": datetime.utcnow().date(),
+        "prompt_tokens": getattr(metadata, "prompt_token_count", 0) or 0,
+        "output_tokens": getattr(metadata, "candidates_token_count", 0) or 0,
+        "total_tokens": getattr(metadata, "total_token_count", 0) or 0,
+    })
+
+def tokens_used_today(user_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(func.coalesce(func.sum(models.ModelUsage.total_tokens), 0)).filter(
+            models.ModelUsage.user_id == user_id,
+            models.ModelUsage.day == datetime.utcnow().date()
+        ).scalar()
+    finally:
+        db.close()
+
+async def budget_mode(user_id: int) -> str:
+    """How much of the pipeline this user may use for the rest of the day"""
+    if DAILY_TOKEN_BUDGET <= 0:
+        return FULL
+    today = datetime.utcnow().date()
+    # Calls that have not been flushed yet still count
+    pending = sum(
+        event["total_tokens"] for event in usage_events.buffer
+        if event["user_id"] == user_id and event["day"] == today
+    )
+    used = await asyncio.to_thread(tokens_used_today, user_id) + pending
+    if used >= DAILY_TOKEN_BUDGET:
+        return EXHAUSTED
+    if used >= DAILY_TOKEN_BUDGET * REDUCED_AT:
+        return REDUCED
+    return FULL
+
+def seconds_until_reset() -> int:
+    now = datetime.utcnow()
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return int((tomorrow - now).total_seconds()) + 1
@@ -0,0 +1,125 @@
+from dotenv import load_dotenv
+load_dotenv()  # before project imports, which read their settings from the environment
+
+import argparse
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from chatbot import get_chat_response, LEARNER_BUCKETS, DEFAULT_BUCKET
+import migrate
+import usage
+from routes import cache, flashcards
+from routes.subjects import load_subjects
+
+# Number of finished explanations to collect before writing them to the cache file
+FLUSH_EVERY = 10
+
+def list_subcategories(category: Optional[str] = None) -> List[str]:
+    return sorted(set(
+        subject['subcategory']
+        for subject in load_subjects()
+        if subject.get('subcategory') and (category is None or subject['category'] == category)
+    ))
+
+def pending_jobs(
+    category: Optional[str] = None,
+    force: bool = False,
+    buckets: Optional[List[str]] = None
+) -> List[Tuple[str, str]]:
+    """List (subcategory, bucket) pairs that still need a cached explanation"""
+    return [
+        (subcategory, bucket)
+        for subcategory in list_subcategories(category)
+        for bucket in (buckets or LEARNER_BUCKETS)
+        if force or not cache.has_explanation(cache.cache_key(subcategory, bucket))
+    ]
+
+async def generate(subcategory: str, bucket: str, semaphore: asyncio.Semaphore) -> Tuple[str, str, Optional[str]]:
+    """Generate one explanation through the chatbot pipeline"""
+    async with semaphore:
+        try:
+            explanation = await get_chat_response(
+                user_query=cache.EXPLANATION_QUERY.format(subcategory=subcategory),
+                bucket=bucket
+            )
+        except Exception as e:
+            print(f"Failed to warm {subcategory} [{bucket}]: {e}")
+            explanation = None
+        return subcategory, bucket, explanation
+
+async def warm(
+    category: Optional[str] = None,
+    concurrency: int = 4,
+    force: bool = False,
+    buckets: Optional[List[str]] = None
+):
+    cache.load_cache()
+    migrate.upgrade()
+    # Model spend of the warm-up is recorded as system usage
+    usage.usage_events.start()
+    jobs = pending_jobs(category, force, buckets)
+    print(f"Warming {len(jobs)} explanations (version {cache.EXPLANATION_VERSION})")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [
+        asyncio.ensure_future(generate(subcategory, bucket, semaphore))
+        for subcategory, bucket in jobs
+    ]
+
+    # Results are flushed in batches so an interrupted run resumes from the last flush
+    batch: Dict[str, str] = {}
+    done_count = 0
+    try:
+        for future in asyncio.as_completed(tasks):
+            subcategory, bucket, explanation = await future
+            done_count += 1
+            if not explanation:
+                continue
+            batch[cache.cache_key(subcategory, bucket)] = explanation
+            # Clients without a bucket read the unscoped key, so seed it from the default bucket
+            if bucket == DEFAULT_BUCKET and not cache.has_explanation(subcategory):
+                batch[subcategory] = explanation
+            if len(batch) >= FLUSH_EVERY:
+                cache.bulk_load(batch)
+                print(f"Flushed {len(batch)} explanations ({done_count}/{len(jobs)} done)")
+                batch = {}
+    finally:
+        if batch:
+            cache.bulk_load(batch)
+            print(f"Flushed {len(batch)} explanations ({done_count}/{len(jobs)} done)")
+        for task in tasks:
+            task.cancel()
+        await usage.usage_events.stop()
+
+async def warm_flashcards(category: Optional[str] = None, concurrency: int = 4):
+    """Generate and store the flashcard deck of every subcategory that does not have one"""
+    migrate.upgrade()
+    usage.usage_events.start()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def warm_deck(topic: str):
+        async with semaphore:
+            try:
+                cards = await flashcards.ensure_deck(topic)
+                print(f"{topic}: {len(cards)} flashcards")
+            except Exception as e:
+                print(f"Failed to generate flashcards for {topic}: {e}")
+
+    try:
+        await asyncio.gather(*(warm_deck(topic) for topic in list_subcategories(category)))
+    finally:
+        await usage.usage_events.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute subject explanations into the cache")
+    parser.add_argument("--category", help="Only warm subcategories of this category")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum concurrent generations")
+    parser.add_argument("--force", action="store_true", help="Regenerate entries that are already cached")
+    parser.add_argument("--bucket", action="append", dest="buckets", choices=LEARNER_BUCKETS,
+                        help="Only warm this learner bucket (repeatable); defaults to all of them")
+    parser.add_argument("--flashcards", action="store_true", help="Generate flashcard decks instead of explanations")
+    args = parser.parse_args()
+    if args.flashcards:
+        asyncio.run(warm_flashcards(args.category, args.concurrency))
+    else:
+        asyncio.run(warm(args.category, args.concurrency, args.force, args.buckets))